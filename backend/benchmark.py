@@ -0,0 +1,308 @@
+"""Offline benchmarks for the recognition hot path.
+
+Runs without Firebase or cameras: the gallery is synthetic, frames are composed from the
+sample crops in benchmark_faces/ and the datastore is an in-memory SQLite store.
+
+    python benchmark.py --gallery-sizes 100,1000,10000 --faces-per-frame 1,2,4 --output results.json
+    python benchmark.py --output new.json --compare results.json
+    python benchmark.py --tracker --tracker-backends torch,onnx
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+import config
+from gallery import CATEGORIES, ENCODING_SIZE
+from measurement import git_revision, peak_rss_mb, rss_mb, summarize
+from storage import SQLiteStore
+from visit_log import VisitLog
+
+# Checked-in crops, kept out of faces/extracted_faces where the server deletes day-old images
+SAMPLE_FACES_DIR = os.path.join(config.BASE_DIR, 'benchmark_faces')
+FRAME_SIZE = (640, 480)
+
+
+def timed(fn, iterations, warmup=2):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def load_sample_crops():
+    crops = []
+    if os.path.isdir(SAMPLE_FACES_DIR):
+        for file in sorted(os.listdir(SAMPLE_FACES_DIR)):
+            if file.lower().endswith(('.png', '.jpg', '.jpeg')):
+                image = cv2.imread(os.path.join(SAMPLE_FACES_DIR, file))
+                if image is not None:
+                    crops.append(image)
+    if not crops:
+        raise SystemExit(f"No sample crops found in {SAMPLE_FACES_DIR}")
+    return crops
+
+
+def compose_frame(crops, faces, seed):
+    """Lay out `faces` sample crops on a grey canvas the size of a processed frame"""
+    width, height = FRAME_SIZE
+    frame = np.full((height, width, 3), 127, dtype=np.uint8)
+    if faces == 0:
+        return frame
+    cols = int(np.ceil(np.sqrt(faces)))
+    rows = int(np.ceil(faces / cols))
+    cell_w, cell_h = width // cols, height // rows
+    rng = np.random.default_rng(seed)
+    for i in range(faces):
+        crop = crops[int(rng.integers(len(crops)))]
+        size = int(min(cell_w, cell_h) * 0.8)
+        crop = cv2.resize(crop, (size, size))
+        top = (i // cols) * cell_h + (cell_h - size) // 2
+        left = (i % cols) * cell_w + (cell_w - size) // 2
+        frame[top:top + size, left:left + size] = crop
+    return frame
+
+
+def synthetic_gallery(size, seed=0):
+    """Random encodings with roughly the norm of real face_recognition encodings"""
+    rng = np.random.default_rng(seed)
+    encodings = rng.normal(0, 0.09, size=(size, ENCODING_SIZE))
+    return {f'synthetic_{i:06d}': encodings[i] for i in range(size)}
+
+
+def make_system(workdir):
+    from main import FaceRecognitionSystem
+
+    faces_dir = os.path.join(workdir, 'faces')
+    for category in CATEGORIES:
+        os.makedirs(os.path.join(faces_dir, category), exist_ok=True)
+    return FaceRecognitionSystem(
+        store=SQLiteStore(':memory:'),
+        visit_log=VisitLog(os.path.join(workdir, 'visits')),
+        faces_dir=faces_dir,
+        load_faces=False,
+        watch_files=False,
+    )
+
+
+def bench_load_face_data(system, crops, images, iterations):
+    """Time the startup gallery scan over `images` copies of the sample crops"""
+    customers_dir = os.path.join(system.faces_dir, 'customers')
+    shutil.rmtree(customers_dir)
+    os.makedirs(customers_dir)
+    for i in range(images):
+        cv2.imwrite(os.path.join(customers_dir, f'customer_{i:05d}.jpg'), crops[i % len(crops)])
+    samples = timed(system.load_face_data, iterations, warmup=0)
+    result = summarize(samples)
+    result['images'] = images
+    result['per_image_ms'] = round(result['mean_ms'] / images, 3)
+    return result
+
+
+def bench_frame(system, frames, iterations):
+    """End-to-end process_frame plus its detect and encode stages on the same frames"""
+    import face_recognition
+
+    def run_process_frame():
+        for frame in frames:
+            # process_frame skips odd frames; keep every call on the processing path
+            system.frame_counter = 1
+            system.process_frame(frame)
+
+    def prepare(frame):
+        return cv2.cvtColor(cv2.resize(frame, FRAME_SIZE), cv2.COLOR_BGR2RGB)
+
+    rgb_frames = [prepare(frame) for frame in frames]
+    locations = [face_recognition.face_locations(rgb, model='hog') for rgb in rgb_frames]
+
+    stages = {
+        'resize': timed(lambda: [prepare(frame) for frame in frames], iterations),
+        'detect': timed(lambda: [face_recognition.face_locations(rgb, model='hog') for rgb in rgb_frames], iterations),
+        'encode': timed(lambda: [face_recognition.face_encodings(rgb, loc, num_jitters=2)
+                                 for rgb, loc in zip(rgb_frames, locations)], iterations),
+        'process_frame': timed(run_process_frame, iterations),
+    }
+    per_frame = {stage: [sample / len(frames) for sample in samples] for stage, samples in stages.items()}
+    result = {stage: summarize(samples) for stage, samples in per_frame.items()}
+    result['fps'] = round(1000 / result['process_frame']['mean_ms'], 2)
+    result['detected_faces'] = sum(len(loc) for loc in locations) / len(frames)
+    return result
+
+
+def bench_match(system, iterations, seed=1):
+    rng = np.random.default_rng(seed)
+    queries = rng.normal(0, 0.09, size=(64, ENCODING_SIZE))
+    snapshot = system.gallery.snapshot('customers')
+
+    def run():
+        for query in queries:
+            snapshot.best_match(query, tolerance=0.4)
+
+    samples = timed(run, iterations)
+    result = summarize([sample / len(queries) for sample in samples])
+    result['gallery_bytes'] = snapshot.nbytes
+    return result
+
+
+def bench_gender(system, crops, iterations):
+    if system.gender_net is None:
+        return {'skipped': 'gender model not available'}
+    samples = timed(lambda: [system.detect_gender(crop) for crop in crops], iterations)
+    return summarize([sample / len(crops) for sample in samples])
+
+
+def bench_tracker(frames, iterations, backend):
+    try:
+        from models.person_detector import create_person_detector
+        from models.yolo_tracker import YOLOTracker
+        started = time.perf_counter()
+        tracker = YOLOTracker(create_person_detector(backend))
+        startup_seconds = time.perf_counter() - started
+    except Exception as e:
+        return {'skipped': f'{backend} tracker unavailable: {str(e)}'}
+    # Disable frame skipping so every call runs detection and tracking
+    tracker.frame_skip = 0
+    tracker.detection_interval = 0
+
+    def run():
+        for frame in frames:
+            tracker.process_frame(frame)
+
+    samples = timed(run, iterations)
+    result = summarize([sample / len(frames) for sample in samples])
+    result['fps'] = round(1000 / result['mean_ms'], 2)
+    result['startup_seconds'] = round(startup_seconds, 3)
+    result['torch_imported'] = 'torch' in sys.modules
+    return result
+
+
+def run(args):
+    crops = load_sample_crops()
+    results = []
+    workdir = tempfile.mkdtemp(prefix='nova-bench-')
+    try:
+        system = make_system(workdir)
+
+        print(f"⏱️ load_face_data ({args.load_images} images)")
+        results.append({'benchmark': 'load_face_data',
+                        **bench_load_face_data(system, crops, args.load_images, args.load_iterations)})
+
+        print("⏱️ detect_gender")
+        results.append({'benchmark': 'detect_gender', **bench_gender(system, crops, args.iterations)})
+
+        for size in args.gallery_sizes:
+            system.gallery.replace_all({'customers': synthetic_gallery(size)})
+            print(f"⏱️ match (gallery={size})")
+            results.append({'benchmark': 'match', 'gallery_size': size,
+                            **bench_match(system, args.iterations), 'rss_mb': rss_mb()})
+
+            for faces in args.faces_per_frame:
+                frames = [compose_frame(crops, faces, seed) for seed in range(args.frames)]
+                print(f"⏱️ process_frame (gallery={size}, faces={faces})")
+                results.append({'benchmark': 'process_frame', 'gallery_size': size, 'faces_per_frame': faces,
+                                **bench_frame(system, frames, args.iterations), 'rss_mb': rss_mb()})
+
+        if args.tracker:
+            frames = [compose_frame(crops, faces, 0) for faces in args.faces_per_frame]
+            # torch stays imported once loaded, so run the torch-free backends first
+            for backend in sorted(args.tracker_backends, key=lambda name: name == 'torch'):
+                print(f"⏱️ YOLOTracker.process_frame ({backend})")
+                results.append({'benchmark': 'tracker', 'backend': backend,
+                                **bench_tracker(frames, args.iterations, backend)})
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'opencv': cv2.__version__,
+        'parameters': {
+            'gallery_sizes': args.gallery_sizes,
+            'faces_per_frame': args.faces_per_frame,
+            'iterations': args.iterations,
+            'frames': args.frames,
+            'load_images': args.load_images,
+        },
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'results': results,
+    }
+
+
+def result_key(result):
+    return (result['benchmark'], result.get('backend'), result.get('gallery_size'), result.get('faces_per_frame'))
+
+
+def headline(result):
+    """The number that represents a result when comparing runs"""
+    if 'process_frame' in result:
+        return result['process_frame']['p50_ms']
+    return result.get('p50_ms')
+
+
+def print_report(report, baseline=None):
+    previous = {}
+    if baseline:
+        previous = {result_key(result): headline(result) for result in baseline['results']}
+
+    print(f"\n📊 Results (revision {report['revision']}, peak RSS {report['peak_rss_mb']} MB)")
+    for result in report['results']:
+        key = result_key(result)
+        label = ' '.join(str(part) for part in key if part is not None)
+        if 'skipped' in result:
+            print(f"  {label:<32} skipped: {result['skipped']}")
+            continue
+        value = headline(result)
+        line = f"  {label:<32} p50 {value:>9.3f} ms"
+        if 'fps' in result:
+            line += f"  {result['fps']:>7.2f} fps"
+        if previous.get(key):
+            change = (value - previous[key]) / previous[key] * 100
+            line += f"  ({change:+.1f}% vs baseline)"
+        print(line)
+
+
+def int_list(value):
+    return [int(part) for part in value.split(',') if part]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the recognition hot path offline')
+    parser.add_argument('--gallery-sizes', type=int_list, default=[100, 1000, 10000])
+    parser.add_argument('--faces-per-frame', type=int_list, default=[0, 1, 4])
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--frames', type=int, default=4, help='distinct frames per scenario')
+    parser.add_argument('--load-images', type=int, default=50, help='images for the load_face_data benchmark')
+    parser.add_argument('--load-iterations', type=int, default=3)
+    parser.add_argument('--tracker', action='store_true', help='also benchmark YOLOTracker.process_frame')
+    parser.add_argument('--tracker-backends', type=lambda value: value.split(','), default=['torch', 'onnx'],
+                        help='person detector backends to compare with --tracker')
+    parser.add_argument('--output', help='write machine-readable results to this JSON file')
+    parser.add_argument('--compare', help='baseline JSON from a previous run to compare against')
+    args = parser.parse_args()
+
+    report = run(args)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Wrote {args.output}")
@@ -0,0 +1,131 @@
+import logging
+import os
+import re
+import threading
+import time
+
+import cv2
+
+import config
+from frame_ring import FrameRing
+from metrics import stage
+
+logger = logging.getLogger('nova')
+
+
+def ring_name(camera_id):
+    """Shared memory name of a camera's frame ring, the same in every worker process"""
+    return f"nova_frames_{config.FLASK_PORT}_{re.sub(r'[^A-Za-z0-9_-]', '_', camera_id)}"
+
+
+def process_alive(pid):
+    if pid <= 0:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def stop_remote_capture(camera_id, timeout=3.0):
+    """Ask whichever process captures camera_id to stop; True once its ring is gone"""
+    try:
+        ring = FrameRing.attach(ring_name(camera_id))
+    except FileNotFoundError:
+        return True
+    try:
+        if not process_alive(ring.owner_pid):
+            return True  # left behind by a dead process; a new FrameRing replaces it
+        ring.request_stop()
+    finally:
+        ring.close()
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            FrameRing.attach(ring_name(camera_id)).close()
+        except FileNotFoundError:
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def open_source(url):
+    """cv2.VideoCapture for a camera URL, or a ReplaySource for replay:// recordings"""
+    if url.startswith('replay://'):
+        from replay import ReplaySource
+        return ReplaySource.from_url(url)
+    return cv2.VideoCapture(url)
+
+
+class CameraCapture:
+    """Decode one camera on its own thread directly into the slots of a FrameRing"""
+
+    def __init__(self, camera_id, url):
+        self.camera_id = camera_id
+        self.url = url
+        self.cap = open_source(url)
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 3)
+        if not self.cap.isOpened():
+            self.cap.release()
+            raise IOError(f"Failed to open camera stream {url}")
+        self.ring = FrameRing(ring_name(camera_id), slots=config.FRAME_RING_SLOTS,
+                              max_width=config.FRAME_MAX_WIDTH, max_height=config.FRAME_MAX_HEIGHT)
+        self.detections = []  # latest results from the inference thread, drawn on previews
+        self.running = True
+        self._thread = threading.Thread(target=self._run, name=f'capture-{camera_id}', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        shape = None
+        while self.running:
+            if self.ring.stop_requested:
+                # Another worker process took over or stopped this camera
+                logger.info(f"⏹️ Camera {self.camera_id} stopped by another worker process")
+                self.running = False
+                self.cap.release()
+                self.ring.close()
+                return
+            try:
+                if shape is None:
+                    # First frame (or after a failure): let OpenCV allocate so we learn the shape
+                    with stage('capture'):
+                        success, frame = self.cap.read()
+                    if not success:
+                        logger.debug("Failed to read frame from camera")
+                        time.sleep(0.1)
+                        continue
+                    shape = frame.shape
+                    self.ring.write(frame)
+                    continue
+
+                slot, view = self.ring.begin_write(shape)
+                with stage('capture'):
+                    success, frame = self.cap.read(view)
+                if not success:
+                    logger.debug("Failed to read frame from camera")
+                    shape = None
+                    time.sleep(0.1)
+                    continue
+                if frame.shape != shape or frame.ctypes.data != view.ctypes.data:
+                    # Resolution changed, or the backend returned its own buffer; copy this once
+                    shape = frame.shape
+                    self.ring.write(frame)
+                    continue
+                self.ring.commit(slot, shape)
+            except ValueError as e:
+                logger.error(f"❌ Camera {self.camera_id}: {str(e)}; raise NOVA_FRAME_MAX_WIDTH/HEIGHT")
+                self.running = False
+            except Exception as e:
+                logger.error(f"❌ Capture error on camera {self.camera_id}: {str(e)}")
+                shape = None
+                time.sleep(0.1)
+
+    def stop(self):
+        self.running = False
+        self._thread.join(timeout=2)
+        self.cap.release()
+        self.ring.close()
@@ -17,6 +17,67 @@ GENDER_MODEL_PATH = os.path.join(MODELS_DIR, 'gender_net.caffemodel')
 FIREBASE_KEY_PATH = os.path.join(BASE_DIR, 'firebase-key.json')
 FIREBASE_DATABASE_URL = 'https://nova-dristi-default-rtdb.firebaseio.com/'
 
+# Datastore configuration: 'firebase' or 'local' (embedded SQLite, synced to Firebase)
+DATASTORE_BACKEND = os.environ.get('NOVA_DATASTORE', 'firebase')
+LOCAL_DATASTORE_PATH = os.path.join(BASE_DIR, 'nova.db')
+DATASTORE_SYNC_INTERVAL = int(os.environ.get('NOVA_DATASTORE_SYNC_INTERVAL', '300'))  # seconds, 0 disables
+
+# Visit log: daily segment files, copied to the datastore in the background when enabled
+VISIT_LOG_DIR = os.path.join(BASE_DIR, 'visits')
+VISIT_REPLICATION = os.environ.get('NOVA_VISIT_REPLICATION', '1') == '1'
+
+# Admin endpoints (/admin/*) only answer local requests; set a token to also require X-Admin-Token
+ADMIN_TOKEN = os.environ.get('NOVA_ADMIN_TOKEN', '')
+PROFILER_ENABLED = os.environ.get('NOVA_PROFILER', '1') == '1'
+
+# Start HTTP first and load models and the gallery in the background (see /health and /ready)
+LAZY_STARTUP = os.environ.get('NOVA_LAZY_STARTUP', '1') == '1'
+
+# Person detector for YOLOTracker: 'torch' (ultralytics), 'onnx' (CPU, no torch import) or
+# 'auto' (onnx when the exported model exists); see models/person_detector.py
+TRACKER_BACKEND = os.environ.get('NOVA_TRACKER_BACKEND', 'auto')
+YOLO_ONNX_PATH = os.environ.get('NOVA_YOLO_ONNX_PATH', os.path.join(MODELS_DIR, 'yolov8n.onnx'))
+YOLO_INPUT_SIZE = int(os.environ.get('NOVA_YOLO_INPUT_SIZE', '640'))
+YOLO_RUNTIME = os.environ.get('NOVA_YOLO_RUNTIME', 'auto')  # 'onnxruntime', 'opencv' or 'auto'
+YOLO_THREADS = int(os.environ.get('NOVA_YOLO_THREADS', '0'))  # 0 leaves the runtime default
+
+# Gallery storage: 'int8' (128 B per face) or 'float16' (256 B). Re-ranking stores templates as
+# float16 instead, for exact distances, and uses the dtype only for the per-identity centroids
+GALLERY_DTYPE = os.environ.get('NOVA_GALLERY_DTYPE', 'int8')
+GALLERY_RERANK = os.environ.get('NOVA_GALLERY_RERANK', '1') == '1'
+
+# Also mirror current detections to the datastore (only when they change); local displays
+# should use /detections/stream instead
+DETECTIONS_TO_DATASTORE = os.environ.get('NOVA_DETECTIONS_TO_DATASTORE', '0') == '1'
+
+# Save confidently recognized live faces as extra templates (faces/<category>/name@live-*.jpg)
+AUTO_HARVEST = os.environ.get('NOVA_AUTO_HARVEST', '0') == '1'
+HARVEST_MAX_TEMPLATES = int(os.environ.get('NOVA_HARVEST_MAX_TEMPLATES', '5'))
+HARVEST_MIN_DISTANCE = 0.2  # closer than this adds nothing over the existing templates
+HARVEST_MAX_DISTANCE = 0.35  # further than this is not confident enough to learn from
+HARVEST_INTERVAL = 3600  # seconds between harvests for the same identity
+
+# Serving processes; above 1 the gallery lives in shared memory and workers share the port
+WORKERS = int(os.environ.get('NOVA_WORKERS', '1'))
+
+# Shared-memory ring of decoded camera frames, per camera (slots must fit the largest frame)
+FRAME_RING_SLOTS = int(os.environ.get('NOVA_FRAME_RING_SLOTS', '4'))
+FRAME_MAX_WIDTH = int(os.environ.get('NOVA_FRAME_MAX_WIDTH', '1920'))
+FRAME_MAX_HEIGHT = int(os.environ.get('NOVA_FRAME_MAX_HEIGHT', '1080'))
+
+# MJPEG preview tiers for /video_feed?tier=...; width 0 keeps the camera resolution
+PREVIEW_TIERS = {
+    'full': {'width': 0, 'quality': 80, 'fps': 15},
+    'lobby': {'width': 960, 'quality': 65, 'fps': 10},
+    'thumb': {'width': 320, 'quality': 50, 'fps': 5},
+}
+PREVIEW_DEFAULT_TIER = os.environ.get('NOVA_PREVIEW_TIER', 'full')
+
+# Sized variants of face images for /faces/<path>?size=N, and how long browsers may reuse them
+THUMBNAIL_CACHE_DIR = os.path.join(BASE_DIR, '.thumbnails')
+THUMBNAIL_SIZES = (64, 128, 256, 512)
+FACES_MAX_AGE = int(os.environ.get('NOVA_FACES_MAX_AGE', '60'))
+
 # Flask configuration
 FLASK_HOST = '127.0.0.1'
 FLASK_PORT = 5000
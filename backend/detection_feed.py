@@ -0,0 +1,217 @@
+"""Local push stream of detections (Server-Sent Events) with delta encoding.
+
+Every processed frame is diffed against the last state sent for its source (camera). Faces are
+tracked across frames by identity and box position, and an event is only emitted when someone
+appears or leaves (a face has to be missing for TRACK_GRACE_FRAMES frames and TRACK_GRACE_SECONDS
+before it counts as gone, so a missed detection doesn't end the track), their identity details change, their box moves by more than MOVE_THRESHOLD
+percent of the frame, or a greeting is due. Clients get the full state when they connect and
+deltas afterwards; a client that falls behind is resynchronized with a fresh snapshot.
+
+With several serving workers each worker keeps its own feed, and relay_worker_feed() passes every
+frame a worker publishes through the owner (run_owner_relay) to the other workers, so a stream on
+any worker carries the detections of frames processed by all of them.
+"""
+import json
+import queue
+import threading
+import time
+
+MOVE_THRESHOLD = 2.0  # percent of the frame a box edge has to move before it is re-sent
+UNKNOWN_MATCH_DISTANCE = 25.0  # percent; further apart, an unknown face is a new person
+SUBSCRIBER_QUEUE_SIZE = 100
+KEEPALIVE_INTERVAL = 15.0
+TRACK_GRACE_FRAMES = 3  # consecutive frames a face must be missing from before it is removed
+TRACK_GRACE_SECONDS = 1.0  # and for how long
+
+# Fields that don't identify a change on their own: greetings are sent as separate events
+VOLATILE_FIELDS = ('location', 'greeting', 'imageSrc')
+
+
+def _center(location):
+    return ((location['left'] + location['right']) / 2, (location['top'] + location['bottom']) / 2)
+
+
+def _moved(old, new):
+    return max(abs(old[edge] - new[edge]) for edge in ('top', 'right', 'bottom', 'left')) > MOVE_THRESHOLD
+
+
+def _details(detection):
+    return {key: value for key, value in detection.items() if key not in VOLATILE_FIELDS}
+
+
+def format_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+class DetectionFeed:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = {}  # source -> {track id: detection as last sent}
+        self._missing = {}  # source -> {track id: (missing since, frames missed)}
+        self._subscribers = set()
+        self._next_track = 1
+        self.version = 0
+        self.forward = None  # called with every locally published frame, see relay_worker_feed
+
+    def publish(self, source, detections, relayed=False):
+        """Diff a frame's detections against the sent state; returns True if an event went out"""
+        if self.forward is not None and not relayed:
+            self.forward(source, detections)
+        with self._lock:
+            previous = self._state.get(source, {})
+            tracks = self._assign_tracks(previous, detections)
+
+            added, updated, moved, greetings = [], [], [], []
+            current = {}
+            for track_id, detection in tracks.items():
+                record = {'id': track_id, **detection}
+                old = previous.get(track_id)
+                # Known people are greeted when they appear; unknown greetings already carry a cooldown
+                if detection.get('greeting') and (old is None or detection.get('type') == 'unknown'):
+                    greetings.append({'id': track_id, 'greeting': detection['greeting']})
+                if old is None:
+                    added.append(record)
+                    current[track_id] = detection
+                    continue
+                if _details(old) != _details(detection):
+                    updated.append(record)
+                    current[track_id] = detection
+                elif 'location' in detection and _moved(old['location'], detection['location']):
+                    moved.append({'id': track_id, 'location': detection['location']})
+                    current[track_id] = detection
+                else:
+                    # Keep the location we last sent so slow drift still crosses the threshold
+                    current[track_id] = dict(detection, location=old.get('location'))
+
+            # Unmatched tracks stay (unchanged for clients) until they have been gone long enough
+            now = time.monotonic()
+            missing, removed = {}, []
+            for track_id, old in previous.items():
+                if track_id in tracks:
+                    continue
+                since, frames = self._missing.get(source, {}).get(track_id, (now, 0))
+                frames += 1
+                if frames >= TRACK_GRACE_FRAMES and now - since >= TRACK_GRACE_SECONDS:
+                    removed.append(track_id)
+                else:
+                    missing[track_id] = (since, frames)
+                    current[track_id] = old
+
+            self._state[source] = current
+            self._missing[source] = missing
+            if not (added or updated or moved or removed or greetings):
+                return False
+            self.version += 1
+            delta = {'source': source, 'version': self.version, 'time': time.time()}
+            for key, items in (('added', added), ('updated', updated), ('moved', moved),
+                               ('removed', removed), ('greetings', greetings)):
+                if items:
+                    delta[key] = items
+            self._broadcast(format_event('delta', delta))
+            return True
+
+    def _assign_tracks(self, previous, detections):
+        """Give each detection the id of the closest previous face with the same identity"""
+        unmatched = dict(previous)
+        tracks = {}
+        for detection in detections:
+            identity = (detection.get('type'), detection.get('name'))
+            best, best_distance = None, None
+            for track_id, old in unmatched.items():
+                if (old.get('type'), old.get('name')) != identity:
+                    continue
+                if 'location' not in old or 'location' not in detection:
+                    distance = 0.0
+                else:
+                    (x1, y1), (x2, y2) = _center(old['location']), _center(detection['location'])
+                    distance = ((x1 - x2) ** 2 + (y1 - y2) ** 2) ** 0.5
+                if identity[0] == 'unknown' and distance > UNKNOWN_MATCH_DISTANCE:
+                    continue
+                if best_distance is None or distance < best_distance:
+                    best, best_distance = track_id, distance
+            if best is None:
+                best = self._next_track
+                self._next_track += 1
+            else:
+                del unmatched[best]
+            tracks[best] = detection
+        return tracks
+
+    def snapshot(self):
+        with self._lock:
+            return self._snapshot()
+
+    def _snapshot(self):
+        return {
+            'version': self.version,
+            'sources': {
+                source: [{'id': track_id, **detection} for track_id, detection in tracks.items()]
+                for source, tracks in self._state.items()
+            },
+        }
+
+    def _broadcast(self, message):
+        for subscriber in list(self._subscribers):
+            try:
+                subscriber.put_nowait(message)
+            except queue.Full:
+                # Too far behind for deltas to be useful; start it over from a snapshot
+                while True:
+                    try:
+                        subscriber.get_nowait()
+                    except queue.Empty:
+                        break
+                subscriber.put_nowait(format_event('snapshot', self._snapshot()))
+
+    def stream(self):
+        """SSE generator for one client"""
+        subscriber = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.add(subscriber)
+            first = format_event('snapshot', self._snapshot())
+        try:
+            yield first
+            while True:
+                try:
+                    yield subscriber.get(timeout=KEEPALIVE_INTERVAL)
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+        finally:
+            with self._lock:
+                self._subscribers.discard(subscriber)
+
+
+def relay_worker_feed(feed, worker_id, upstream, downstream):
+    """Send this worker's frames to the owner and publish the frames other workers processed"""
+    def forward(source, detections):
+        try:
+            upstream.put_nowait((worker_id, source, detections))
+        except queue.Full:
+            pass  # the owner is behind; other workers miss this frame, not this one
+
+    def receive():
+        while True:
+            _, source, detections = downstream.get()
+            try:
+                feed.publish(source, detections, relayed=True)
+            except Exception as e:
+                print(f"❌ Error publishing relayed detections: {str(e)}")
+
+    feed.forward = forward
+    threading.Thread(target=receive, name='detection-relay', daemon=True).start()
+
+
+def run_owner_relay(upstream, downstreams):
+    """Owner side: pass every worker's frames on to all other workers ({worker id: queue})"""
+    def relay():
+        while True:
+            item = upstream.get()
+            for worker_id, downstream in list(downstreams.items()):
+                if worker_id == item[0]:
+                    continue
+                try:
+                    downstream.put_nowait(item)
+                except queue.Full:
+                    pass
+
+    threading.Thread(target=relay, name='detection-relay', daemon=True).start()
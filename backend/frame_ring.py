@@ -0,0 +1,163 @@
+"""Fixed-size ring of preallocated frame slots in shared memory.
+
+One capture thread decodes camera frames straight into the slots (cv2.VideoCapture.read(image=...))
+and any number of readers, in this or other processes, use the newest slot as a NumPy view
+without copying or pickling. Each slot carries a sequence number that doubles as a seqlock: it is
+set to -1 while the slot is being written, so a reader can call Frame.valid() after using a view
+to find out whether the writer lapped the ring underneath it.
+
+The owning process's pid is kept in the header, together with a stop flag that lets another
+worker process ask the owner to stop capturing.
+
+Layout: int64[8] header (slots, slot bytes, latest sequence, owner pid, stop requested, reserved),
+then int64[8] per slot
+(sequence, height, width, channels, timestamp ns), then the 64-byte aligned slot data.
+"""
+import os
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from shared_gallery import align, untrack
+
+HEADER_FIELDS = 8
+SLOT_FIELDS = 8
+WRITING = -1
+
+
+class Frame:
+    """A frame in the ring; `image` is a read-only view into shared memory"""
+    __slots__ = ('ring', 'slot', 'seq', 'timestamp', 'image')
+
+    def __init__(self, ring, slot, seq, timestamp, image):
+        self.ring = ring
+        self.slot = slot
+        self.seq = seq
+        self.timestamp = timestamp
+        self.image = image
+
+    def valid(self):
+        """False once the writer has started reusing this slot"""
+        return int(self.ring._meta[self.slot, 0]) == self.seq
+
+
+class FrameRing:
+    def __init__(self, name, slots=4, max_width=1920, max_height=1080, channels=3, create=True):
+        self.name = name
+        if create:
+            slot_bytes = align(max_width * max_height * channels)
+            data_start = align((HEADER_FIELDS + slots * SLOT_FIELDS) * 8)
+            try:
+                stale = shared_memory.SharedMemory(name=name)
+                stale.close()
+                stale.unlink()
+            except FileNotFoundError:
+                pass
+            self._shm = shared_memory.SharedMemory(name=name, create=True, size=data_start + slots * slot_bytes)
+            header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=self._shm.buf)
+            header[:] = (slots, slot_bytes, 0, os.getpid(), 0, 0, 0, 0)
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+            untrack(self._shm)
+        self.owner = create
+        self._closed = False
+
+        self._header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=self._shm.buf)
+        self.slots, self.slot_bytes = int(self._header[0]), int(self._header[1])
+        self._meta = np.ndarray((self.slots, SLOT_FIELDS), dtype=np.int64, buffer=self._shm.buf,
+                                offset=HEADER_FIELDS * 8)
+        if create:
+            self._meta[:] = 0
+        self._data_start = align((HEADER_FIELDS + self.slots * SLOT_FIELDS) * 8)
+
+    @classmethod
+    def attach(cls, name):
+        return cls(name, create=False)
+
+    @property
+    def latest_seq(self):
+        return int(self._header[2])
+
+    @property
+    def owner_pid(self):
+        return int(self._header[3])
+
+    @property
+    def stop_requested(self):
+        return not self.closed and bool(self._header[4])
+
+    def request_stop(self):
+        """Ask the owning process to stop writing and remove the ring"""
+        self._header[4] = 1
+
+    def _view(self, slot, shape):
+        return np.ndarray(shape, dtype=np.uint8, buffer=self._shm.buf,
+                          offset=self._data_start + slot * self.slot_bytes)
+
+    # Writer side (a single capture thread)
+
+    def begin_write(self, shape):
+        """Claim the next slot and return (slot, writable view of `shape`)"""
+        if int(np.prod(shape)) > self.slot_bytes:
+            raise ValueError(f"Frame of shape {shape} does not fit a {self.slot_bytes} byte slot")
+        seq = self.latest_seq + 1
+        slot = seq % self.slots
+        self._meta[slot, 0] = WRITING
+        return slot, self._view(slot, shape)
+
+    def commit(self, slot, shape, timestamp=None):
+        """Publish the slot claimed by begin_write"""
+        seq = self.latest_seq + 1
+        height, width = shape[:2]
+        channels = shape[2] if len(shape) > 2 else 1
+        self._meta[slot, 1:5] = (height, width, channels, time.time_ns() if timestamp is None else timestamp)
+        self._meta[slot, 0] = seq
+        self._header[2] = seq
+        return seq
+
+    def write(self, image):
+        """Copy an already decoded frame in; capture should prefer reading into begin_write()"""
+        slot, view = self.begin_write(image.shape)
+        np.copyto(view, image)
+        return self.commit(slot, image.shape)
+
+    # Reader side
+
+    def latest(self):
+        """The newest complete frame, or None if nothing has been written yet"""
+        for _ in range(self.slots):
+            seq = self.latest_seq
+            if seq == 0:
+                return None
+            slot = seq % self.slots
+            height, width, channels, timestamp = (int(v) for v in self._meta[slot, 1:5])
+            if int(self._meta[slot, 0]) != seq:
+                continue  # lapped between reading the header and the slot; try the new latest
+            shape = (height, width) if channels == 1 else (height, width, channels)
+            image = self._view(slot, shape)
+            image.setflags(write=False)
+            return Frame(self, slot, seq, timestamp / 1e9, image)
+        return None
+
+    def wait_next(self, after_seq, timeout=1.0, poll=0.002):
+        """Block until a frame newer than after_seq is available and return it, or None on timeout"""
+        deadline = time.monotonic() + timeout
+        while not self.closed and self.latest_seq <= after_seq:
+            if time.monotonic() > deadline:
+                return None
+            time.sleep(poll)
+        return None if self.closed else self.latest()
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def close(self):
+        if self._closed:
+            return
+        # Readers may be between a closed check and a header read, and frames hold views into the
+        # slots, so the mapping stays until the ring is garbage collected; unlinking removes the name
+        self._closed = True
+        if self.owner:
+            self._shm.unlink()
@@ -0,0 +1,367 @@
+import threading
+import time
+
+import numpy as np
+
+import config
+
+CATEGORIES = ('staff', 'customers')
+ENCODING_SIZE = 128
+MATCH_CHUNK = 16384  # rows dequantized at a time while scanning
+CENTROID_CANDIDATES = 4  # identities whose templates are compared after the centroid scan
+TEMPLATE_SEPARATOR = '@'
+
+
+def identity_name(template_key):
+    """Identity a template belongs to: 'alice@2' and 'alice' are both templates of 'alice'"""
+    return template_key.split(TEMPLATE_SEPARATOR, 1)[0]
+
+
+class NameTable:
+    """Names stored back to back in one UTF-8 buffer and decoded only when looked up"""
+    __slots__ = ('blob', 'offsets')
+
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+
+    @classmethod
+    def from_names(cls, names):
+        encoded = [name.encode('utf-8') for name in names]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        return cls(np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        return self.blob[self.offsets[index]:self.offsets[index + 1]].tobytes().decode('utf-8')
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+
+class QuantizedVectors:
+    """Rows stored as int8 codes with a float32 scale each (or float16 with unit scales)"""
+    __slots__ = ('codes', 'scales', 'norms')
+
+    def __init__(self, codes, scales, norms=None):
+        if norms is None:
+            # Squared norms of the dequantized rows, for distances via |q|^2 + |e|^2 - 2 q.e
+            as_float = codes.astype(np.float32)
+            norms = ((scales ** 2) * np.einsum('ij,ij->i', as_float, as_float)).astype(np.float32)
+        self.codes = codes
+        self.scales = scales
+        self.norms = norms
+        for array in (codes, scales, norms):
+            array.setflags(write=False)
+
+    @classmethod
+    def quantize(cls, vectors, dtype):
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, ENCODING_SIZE)
+        if dtype == 'int8':
+            scales = np.abs(vectors).max(axis=1) / 127
+            scales[scales == 0] = 1
+            codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+            return cls(codes, scales.astype(np.float32))
+        return cls(vectors.astype(dtype), np.ones(len(vectors), dtype=np.float32))
+
+    def __len__(self):
+        return len(self.codes)
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + self.scales.nbytes + self.norms.nbytes
+
+    def take(self, rows):
+        return QuantizedVectors(self.codes[rows], self.scales[rows], self.norms[rows])
+
+    def dequantize(self, rows=slice(None)):
+        return self.codes[rows].astype(np.float32) * self.scales[rows, None]
+
+    def distances(self, query):
+        """Squared distances from query to every row, dequantizing in chunks"""
+        dots = np.empty(len(self), dtype=np.float32)
+        for start in range(0, len(self), MATCH_CHUNK):
+            block = self.codes[start:start + MATCH_CHUNK]
+            np.dot(block.astype(np.float32), query, out=dots[start:start + len(block)])
+        return self.norms - 2 * self.scales * dots + float(query @ query)
+
+
+class Match:
+    __slots__ = ('name', 'distance', 'templates')
+
+    def __init__(self, name, distance, templates):
+        self.name = name
+        self.distance = distance
+        self.templates = templates
+
+
+class GallerySnapshot:
+    """Immutable, compact view of one gallery category used by the matching code.
+
+    An identity owns one or more templates (encodings of different photos), stored as
+    contiguous rows grouped by identity, plus a quantized centroid per identity. Matching scans
+    only the centroids, then compares the templates of the closest CENTROID_CANDIDATES
+    identities, so the cost grows with the number of people rather than photos. Templates are
+    kept either quantized (`templates`) or, when re-ranking, as `exact` float16 rows only; the
+    quantized dtype then applies to the centroid scan.
+    """
+    __slots__ = ('names', 'template_offsets', 'keys', 'templates', 'exact', 'centroids')
+
+    def __init__(self, names, template_offsets, keys, templates, exact, centroids):
+        self.names = names  # identity names
+        self.template_offsets = template_offsets  # identity i owns rows offsets[i]:offsets[i + 1]
+        self.keys = keys  # template keys (file stems), one per row
+        self.templates = templates
+        self.exact = exact
+        self.centroids = centroids
+        template_offsets.setflags(write=False)
+        if exact is not None:
+            exact.setflags(write=False)
+
+    @classmethod
+    def empty(cls, dtype='int8', rerank=True):
+        return cls.from_encodings([], np.empty((0, ENCODING_SIZE)), dtype, rerank)
+
+    @classmethod
+    def from_encodings(cls, keys, encodings, dtype='int8', rerank=True):
+        encodings = np.asarray(encodings).reshape(-1, ENCODING_SIZE)
+        if rerank:
+            return cls._assemble(list(keys), None, encodings.astype(np.float16), dtype)
+        return cls._assemble(list(keys), QuantizedVectors.quantize(encodings, dtype), None, dtype)
+
+    @classmethod
+    def _assemble(cls, keys, templates, exact, dtype):
+        """Group template rows by identity and compute the centroids"""
+        rows_by_identity = {}
+        for row, key in enumerate(keys):
+            rows_by_identity.setdefault(identity_name(key), []).append(row)
+        order = np.array([row for rows in rows_by_identity.values() for row in rows], dtype=np.int64)
+        offsets = np.zeros(len(rows_by_identity) + 1, dtype=np.int64)
+        np.cumsum([len(rows) for rows in rows_by_identity.values()], out=offsets[1:])
+
+        templates = templates.take(order) if templates is not None else None
+        exact = exact[order] if exact is not None else None
+        vectors = exact.astype(np.float32) if exact is not None else templates.dequantize()
+        if len(order):
+            sums = np.add.reduceat(vectors, offsets[:-1], axis=0)
+            centroid_vectors = sums / np.diff(offsets)[:, None]
+        else:
+            centroid_vectors = np.empty((0, ENCODING_SIZE), dtype=np.float32)
+        return cls(NameTable.from_names(rows_by_identity), offsets,
+                   NameTable.from_names([keys[row] for row in order]), templates, exact,
+                   QuantizedVectors.quantize(centroid_vectors, dtype))
+
+    def __len__(self):
+        return len(self.names)
+
+    @property
+    def dtype(self):
+        return self.centroids.codes.dtype.name
+
+    @property
+    def nbytes(self):
+        arrays = (self.exact, self.template_offsets, self.names.blob, self.names.offsets,
+                  self.keys.blob, self.keys.offsets)
+        return (self.centroids.nbytes + (self.templates.nbytes if self.templates is not None else 0)
+                + sum(array.nbytes for array in arrays if array is not None))
+
+    def updated(self, upserts, removals):
+        """New snapshot with {template key: encoding} upserts and a set of removed keys applied"""
+        keep = [i for i, key in enumerate(self.keys) if key not in upserts and key not in removals]
+        added = np.array(list(upserts.values())).reshape(-1, ENCODING_SIZE)
+        templates = exact = None
+        if self.exact is not None:
+            exact = np.concatenate([self.exact[keep], added.astype(np.float16)])
+        else:
+            added_templates = QuantizedVectors.quantize(added, self.dtype)
+            kept = self.templates.take(keep)
+            templates = QuantizedVectors(np.concatenate([kept.codes, added_templates.codes]),
+                                         np.concatenate([kept.scales, added_templates.scales]),
+                                         np.concatenate([kept.norms, added_templates.norms]))
+        return GallerySnapshot._assemble([self.keys[i] for i in keep] + list(upserts), templates, exact, self.dtype)
+
+    def template_keys(self, name):
+        """Keys of every template of an identity"""
+        for i, identity in enumerate(self.names):
+            if identity == name:
+                return [self.keys[row] for row in range(self.template_offsets[i], self.template_offsets[i + 1])]
+        return []
+
+    def to_arrays(self):
+        """Flatten into NumPy arrays, e.g. for publishing through shared memory"""
+        arrays = {
+            'name_blob': self.names.blob,
+            'name_offsets': self.names.offsets,
+            'template_offsets': self.template_offsets,
+            'key_blob': self.keys.blob,
+            'key_offsets': self.keys.offsets,
+            'centroid_codes': self.centroids.codes,
+            'centroid_scales': self.centroids.scales,
+            'centroid_norms': self.centroids.norms,
+        }
+        if self.templates is not None:
+            arrays.update(codes=self.templates.codes, scales=self.templates.scales, norms=self.templates.norms)
+        if self.exact is not None:
+            arrays['exact'] = self.exact
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """Inverse of to_arrays; the arrays are used in place without copying"""
+        return cls(
+            NameTable(arrays['name_blob'], arrays['name_offsets']),
+            arrays['template_offsets'],
+            NameTable(arrays['key_blob'], arrays['key_offsets']),
+            QuantizedVectors(arrays['codes'], arrays['scales'], arrays['norms']) if 'codes' in arrays else None,
+            arrays.get('exact'),
+            QuantizedVectors(arrays['centroid_codes'], arrays['centroid_scales'], arrays['centroid_norms']),
+        )
+
+    def match(self, face_encoding):
+        """Closest identity as a Match, or None for an empty gallery"""
+        if not len(self):
+            return None
+        query = np.asarray(face_encoding, dtype=np.float32)
+
+        # Prefilter on centroids, then refine within the candidates' templates
+        centroid_distances = self.centroids.distances(query)
+        count = min(CENTROID_CANDIDATES, len(self))
+        candidates = np.argpartition(centroid_distances, count - 1)[:count]
+        offsets = self.template_offsets
+        rows = np.concatenate([np.arange(offsets[i], offsets[i + 1]) for i in candidates])
+        vectors = self.exact[rows].astype(np.float32) if self.exact is not None else self.templates.dequantize(rows)
+        differences = vectors - query
+        distances = np.einsum('ij,ij->i', differences, differences)
+
+        best = int(np.argmin(distances))
+        identity = int(np.searchsorted(offsets, rows[best], side='right')) - 1
+        return Match(self.names[identity], float(np.sqrt(max(float(distances[best]), 0.0))),
+                     int(offsets[identity + 1] - offsets[identity]))
+
+    def best_match(self, face_encoding, tolerance):
+        """Return the name of the closest identity within tolerance, or None"""
+        match = self.match(face_encoding)
+        if match is not None and match.distance <= tolerance:
+            return match.name
+        return None
+
+
+class FaceGallery:
+    """Face encodings per category, swapped copy-on-write so readers never lock"""
+
+    def __init__(self, dtype=config.GALLERY_DTYPE, rerank=config.GALLERY_RERANK):
+        self.dtype = dtype
+        self.rerank = rerank
+        self._snapshots = {category: GallerySnapshot.empty(dtype, rerank) for category in CATEGORIES}
+        self._write_lock = threading.Lock()
+        self._listeners = []
+
+    def add_listener(self, callback):
+        """Call callback({category: snapshot}) with the current gallery and after every change"""
+        with self._write_lock:
+            self._listeners.append(callback)
+            callback(dict(self._snapshots))
+
+    def _notify(self):
+        for callback in self._listeners:
+            try:
+                callback(dict(self._snapshots))
+            except Exception as e:
+                print(f"❌ Error publishing gallery: {str(e)}")
+
+    def snapshot(self, category):
+        return self._snapshots[category]
+
+    def count(self, category):
+        return len(self._snapshots[category])
+
+    def replace_all(self, entries_by_category):
+        """Replace the whole gallery, e.g. after the initial directory scan"""
+        with self._write_lock:
+            for category in CATEGORIES:
+                entries = entries_by_category.get(category, {})
+                encodings = np.array(list(entries.values())).reshape(-1, ENCODING_SIZE)
+                self._snapshots[category] = GallerySnapshot.from_encodings(
+                    list(entries), encodings, self.dtype, self.rerank)
+            self._notify()
+
+    def apply(self, upserts=(), removals=()):
+        """Apply a batch of (category, template key, encoding) upserts and (category, key) removals"""
+        with self._write_lock:
+            changes = {}
+            for category, name, encoding in upserts:
+                changes.setdefault(category, ({}, set()))[0][name] = encoding
+            for category, name in removals:
+                category_upserts, category_removals = changes.setdefault(category, ({}, set()))
+                category_upserts.pop(name, None)
+                category_removals.add(name)
+
+            # Build every new snapshot before publishing any of them
+            snapshots = {
+                category: self._snapshots[category].updated(category_upserts, category_removals)
+                for category, (category_upserts, category_removals) in changes.items()
+            }
+            self._snapshots.update(snapshots)
+            if changes:
+                self._notify()
+
+
+class DebouncedReloader:
+    """Coalesce file system events per path and flush them in batches once they settle"""
+
+    def __init__(self, flush, delay=1.0, max_delay=5.0):
+        self._flush = flush
+        self.delay = delay
+        self.max_delay = max_delay
+        self._pending = {}  # path -> (first_seen, last_seen)
+        self._cond = threading.Condition()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='face-reloader', daemon=True)
+        self._thread.start()
+
+    def touch(self, path):
+        """Record an event for path; repeated events only push its deadline back"""
+        now = time.monotonic()
+        with self._cond:
+            first_seen = self._pending.get(path, (now, now))[0]
+            self._pending[path] = (first_seen, now)
+            self._cond.notify()
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        self._thread.join()
+
+    def _take_ready(self):
+        """Pop settled paths, or return the time to wait until the next one settles"""
+        now = time.monotonic()
+        ready = []
+        wait = None
+        for path, (first_seen, last_seen) in self._pending.items():
+            deadline = min(last_seen + self.delay, first_seen + self.max_delay)
+            if deadline <= now:
+                ready.append(path)
+            else:
+                wait = deadline - now if wait is None else min(wait, deadline - now)
+        for path in ready:
+            del self._pending[path]
+        return ready, wait
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if not self._running:
+                        return
+                    ready, wait = self._take_ready()
+                    if ready:
+                        break
+                    self._cond.wait(wait)
+            try:
+                self._flush(sorted(ready))
+            except Exception as e:
+                print(f"❌ Error reloading faces: {str(e)}")
@@ -1,83 +1,207 @@
 import cv2
-import face_recognition
-import firebase_admin
-from firebase_admin import credentials, db
 import os
+import functools
 import numpy as np
-from datetime import datetime, timedelta
-from flask import Flask, request, jsonify, send_from_directory, Response
+from datetime import date, datetime, timedelta
+from flask import Flask, request, jsonify, send_file, Response
 from flask_cors import CORS
 import base64
+import logging
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 import time
 import threading
 import urllib.request
 import urllib.parse
+import config
+import metrics
+from metrics import stage
+from profiler import ProfilerBusy, SamplingProfiler, format_collapsed
+from gallery import CATEGORIES, TEMPLATE_SEPARATOR, DebouncedReloader, FaceGallery, identity_name
+from capture import CameraCapture, ring_name, stop_remote_capture
+from frame_ring import FrameRing
+from preview import PreviewHub, tier_settings
+from detection_feed import DetectionFeed
+from thumbnails import ThumbnailCache
+from storage import create_store
+from startup import StartupState
+from visit_log import VisitLog, parse_category, parse_day
+
+# face_recognition loads its dlib models on import, which takes seconds; it is imported by
+# load_face_recognition() on the startup thread so HTTP can come up first
+face_recognition = None
+
+def load_face_recognition():
+    global face_recognition
+    if face_recognition is None:
+        import face_recognition
+    return face_recognition
+
+logger = logging.getLogger('nova')
 
 # Initialize Flask app
 app = Flask(__name__)
 CORS(app)
 
-# Global variable to store the camera stream
-camera_stream = None
+@app.after_request
+def count_request(response):
+    metrics.HTTP_REQUESTS_TOTAL.inc(endpoint=request.endpoint or 'unknown', status=response.status_code)
+    return response
 
-def generate_frames():
-    global camera_stream
-    while True:
-        if camera_stream is None:
-            time.sleep(0.1)
+startup = StartupState()
+
+# Detections pushed to local displays by /detections/stream
+detection_feed = DetectionFeed()
+metrics_spool = None  # set in serving workers so /metrics covers every process
+
+# Set once startup has finished loading models and the gallery
+system = None
+
+def requires_system(view):
+    """Answer 503 with the startup progress until the recognition system is ready"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if system is None:
+            return jsonify({'status': 'error', 'message': 'System is starting', 'startup': startup.status()}), 503
+        return view(*args, **kwargs)
+    return wrapper
+
+@app.route('/health')
+def health():
+    status = startup.status()
+    return jsonify({'status': 'error' if status['error'] else 'ok', **status}), 500 if status['error'] else 200
+
+@app.route('/ready')
+def ready():
+    status = startup.status()
+    return jsonify({'status': 'ready' if status['ready'] else 'starting', **status}), 200 if status['ready'] else 503
+
+@app.route('/metrics')
+def metrics_endpoint():
+    text = metrics_spool.render() if metrics_spool else metrics.REGISTRY.render()
+    return Response(text, mimetype=None, content_type=metrics.CONTENT_TYPE)
+
+@app.route('/detections')
+def current_detections():
+    return jsonify(detection_feed.snapshot())
+
+@app.route('/detections/stream')
+def detections_stream():
+    """Server-Sent Events: a 'snapshot' event on connect, then 'delta' events as detections change"""
+    return Response(detection_feed.stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+profiler = SamplingProfiler()
+
+def is_admin_request():
+    """Admin endpoints are limited to local clients, plus the admin token when one is configured"""
+    if request.remote_addr not in ('127.0.0.1', '::1'):
+        return False
+    return not config.ADMIN_TOKEN or request.headers.get('X-Admin-Token') == config.ADMIN_TOKEN
+
+@app.route('/admin/profile', methods=['GET', 'POST'])
+def capture_profile():
+    if not config.PROFILER_ENABLED:
+        return jsonify({'status': 'error', 'message': 'Profiler is disabled'}), 404
+    if not is_admin_request():
+        return jsonify({'status': 'error', 'message': 'Forbidden'}), 403
+    try:
+        seconds = float(request.args.get('seconds', 10))
+        hz = int(request.args.get('hz', 100))
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'seconds and hz must be numbers'}), 400
+    
+    try:
+        logger.info(f"Capturing {seconds}s sampling profile at {hz} Hz")
+        stacks = profiler.capture(seconds, hz=hz, thread_filter=request.args.get('thread'))
+    except ProfilerBusy as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 409
+    
+    filename = f"nova-profile-{datetime.now().strftime('%Y%m%d_%H%M%S')}.collapsed"
+    return Response(format_collapsed(stacks), mimetype='text/plain',
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+# Cameras captured by this process, by camera id; a camera is captured by at most one worker process
+cameras = {}
+cameras_lock = threading.Lock()
+
+def run_inference(capture):
+    """Recognize faces on the newest frame of a camera's ring, skipping frames while busy"""
+    last_seq = 0
+    while capture.running:
+        frame = capture.ring.wait_next(last_seq)
+        if frame is None:
             continue
-            
-        success, frame = camera_stream.read()
-        if not success:
-            print("Failed to read frame from camera")
-            time.sleep(0.1)
+        # Advance even while the system is starting up, so we block for the next frame instead of spinning
+        last_seq = frame.seq
+        if system is None:
             continue
-            
-        # Convert frame to JPEG
-        ret, buffer = cv2.imencode('.jpg', frame)
-        if not ret:
+        try:
+            detections = system.process_frame(frame.image, skip_alternate=False, source=capture.camera_id,
+                                              frame_valid=frame.valid)
+        except Exception as e:
+            logger.error(f"Error processing frame: {str(e)}")
+            time.sleep(0.1)
             continue
-            
-        # Convert to bytes
-        frame_bytes = buffer.tobytes()
-        
-        # Yield the frame in MJPEG format
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+        if detections is not None:
+            capture.detections = detections
+
+preview_hub = PreviewHub()
+thumbnail_cache = ThumbnailCache()
 
 @app.route('/video_feed')
+@requires_system
 def video_feed():
-    return Response(generate_frames(),
+    """MJPEG preview; ?tier=full|lobby|thumb, optionally overridden by ?width=&quality=&fps="""
+    camera_id = request.args.get('camera', 'default')
+    try:
+        width, quality, fps = tier_settings(request.args)
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'width, quality and fps must be integers'}), 400
+    
+    capture = cameras.get(camera_id)
+    if capture is not None and capture.running:
+        ring_factory = lambda: capture.ring
+        detections = lambda: capture.detections
+    else:
+        # Another worker process may be capturing this camera; encoders attach to its ring
+        try:
+            FrameRing.attach(ring_name(camera_id)).close()
+        except FileNotFoundError:
+            return jsonify({'status': 'error', 'message': 'Camera stream not started'}), 404
+        ring_factory = lambda: FrameRing.attach(ring_name(camera_id))
+        detections = lambda: []
+    return Response(preview_hub.stream(camera_id, ring_factory, detections, width, quality, fps),
                     mimetype='multipart/x-mixed-replace; boundary=frame')
 
 @app.route('/start_stream', methods=['POST'])
 def start_stream():
-    global camera_stream
     try:
         data = request.get_json()
         ip_camera_url = data.get('camera_url')
+        camera_id = data.get('camera_id', 'default')
         
         if not ip_camera_url:
             return jsonify({'status': 'error', 'message': 'Camera URL is required'}), 400
             
         # Decode the URL
         ip_camera_url = urllib.parse.unquote(ip_camera_url)
-        print(f"Starting stream with URL: {ip_camera_url}")
+        print(f"Starting stream {camera_id} with URL: {ip_camera_url}")
         
-        # Release existing stream if any
-        if camera_stream is not None:
-            camera_stream.release()
+        with cameras_lock:
+            # Release existing stream if any
+            existing = cameras.pop(camera_id, None)
+            if existing is not None:
+                existing.stop()
+            elif not stop_remote_capture(camera_id):
+                return jsonify({'status': 'error', 'message': 'Camera is still captured by another worker process'}), 409
             
-        # Configure VideoCapture for RTSP stream
-        camera_stream = cv2.VideoCapture(ip_camera_url)
-        
-        # Set buffer size
-        camera_stream.set(cv2.CAP_PROP_BUFFERSIZE, 3)
-        
-        if not camera_stream.isOpened():
-            return jsonify({'status': 'error', 'message': 'Failed to open camera stream'}), 500
+            try:
+                capture = CameraCapture(camera_id, ip_camera_url)
+            except IOError:
+                return jsonify({'status': 'error', 'message': 'Failed to open camera stream'}), 500
+            cameras[camera_id] = capture
+        threading.Thread(target=run_inference, args=(capture,), name=f'inference-{camera_id}', daemon=True).start()
             
         return jsonify({'status': 'success', 'message': 'Stream started successfully'})
         
@@ -85,60 +209,18 @@ def start_stream():
         print(f"Error starting stream: {str(e)}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
-def generate_frames():
-    global camera_stream
-    while True:
-        if camera_stream is None:
-            time.sleep(0.1)
-            continue
-            
-        success, frame = camera_stream.read()
-        if not success:
-            print("Failed to read frame from camera")
-            time.sleep(0.1)
-            continue
-            
-        try:
-            # Process frame for face recognition
-            face_system = FaceRecognitionSystem()
-            detections = face_system.process_frame(frame)
-            
-            # Draw detection boxes
-            for detection in detections:
-                if 'location' in detection:
-                    h, w = frame.shape[:2]
-                    top = int((detection['location']['top'] * h) / 100)
-                    right = int((detection['location']['right'] * w) / 100)
-                    bottom = int((detection['location']['bottom'] * h) / 100)
-                    left = int((detection['location']['left'] * w) / 100)
-                    
-                    # Draw rectangle for face
-                    cv2.rectangle(frame, (left, top), (right, bottom), (0, 255, 0), 2)
-            
-            # Convert frame to JPEG with lower quality for better performance
-            encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), 80]
-            ret, buffer = cv2.imencode('.jpg', frame, encode_param)
-            if not ret:
-                continue
-                
-            # Convert to bytes
-            frame_bytes = buffer.tobytes()
-            
-            # Yield the frame in MJPEG format
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-                   
-        except Exception as e:
-            print(f"Error processing frame: {str(e)}")
-            time.sleep(0.1)
-
 @app.route('/stop_stream', methods=['POST'])
 def stop_stream():
-    global camera_stream
     try:
-        if camera_stream is not None:
-            camera_stream.release()
-            camera_stream = None
+        data = request.get_json(silent=True) or {}
+        with cameras_lock:
+            camera_id = data.get('camera_id', 'default')
+            capture = cameras.pop(camera_id, None)
+            if capture is not None:
+                capture.stop()
+            elif not stop_remote_capture(camera_id):
+                # The camera may be captured by another worker process; it is asked to stop
+                return jsonify({'status': 'error', 'message': 'Camera is still captured by another worker process'}), 409
         return jsonify({'status': 'success', 'message': 'Stream stopped successfully'})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -160,27 +242,63 @@ def download_cascade_classifier():
             return False
     return True
 
-# Download cascade classifier before initializing the system
-if not download_cascade_classifier():
-    print("⚠️ Cascade classifier not available, face detection may be slower")
+def is_face_image(path):
+    return path.lower().endswith(('.png', '.jpg', '.jpeg'))
+
+def has_primary_image(dir_path, name):
+    """True if name.jpg (or .jpeg/.png) exists; templates without one are not matched"""
+    return any(os.path.exists(os.path.join(dir_path, name + ext))
+               for ext in ('.jpg', '.jpeg', '.png', '.JPG', '.JPEG', '.PNG'))
+
+def template_paths(image_path, name):
+    """Paths of the name@suffix templates next to a primary image"""
+    dir_path = os.path.dirname(image_path)
+    prefix = f"{name}{TEMPLATE_SEPARATOR}"
+    try:
+        files = os.listdir(dir_path)
+    except OSError:
+        return []
+    return [os.path.join(dir_path, file) for file in files if file.startswith(prefix) and is_face_image(file)]
+
+def profile_key(name):
+    """Firebase key for a profile, derived from its image file name"""
+    return name.lower().replace(' ', '_')
 
-# Initialize Firebase
-cred = credentials.Certificate("firebase-key.json")
-firebase_admin.initialize_app(cred, {
-    'databaseURL': 'https://nova-dristi-default-rtdb.firebaseio.com/'
-})
+def profile_sync_fields(category, name, file, existing_data):
+    """Fields to write so a profile matches its image file, keeping existing values"""
+    fields = {
+        'name': name,
+        'imagePath': f'/faces/{category}/{file}',
+        'lastUpdated': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    }
+    # Set default values only if they don't exist
+    if category == 'customers' and 'visitCount' not in existing_data:
+        fields['visitCount'] = 0
+    return fields
 
 class FaceRecognitionSystem:
-    def __init__(self):
-        self.staff_faces = []
-        self.known_faces = []
-        self.firebase_ref = db.reference('/')
+    def __init__(self, store=None, visit_log=None, faces_dir='faces', load_faces=True, watch_files=True,
+                 on_progress=None, gallery=None, detection_feed=None, auto_harvest=None):
+        load_face_recognition()
+        self.on_progress = on_progress
+        self.detection_feed = detection_feed if detection_feed is not None else DetectionFeed()
+        self.gallery = gallery if gallery is not None else FaceGallery()
+        self.store = store if store is not None else create_store()
+        if visit_log is None:
+            visit_log = VisitLog(replicate_to=self.store if config.VISIT_REPLICATION else None)
+        self.visit_log = visit_log
+        self.faces_dir = faces_dir
         self.face_modification_times = {}  # Track modification times of face files
-        self.load_face_data()
+        if load_faces:
+            self.load_face_data()
         self.setup_gender_model()
-        self.setup_file_watcher()
+        if watch_files:
+            self.setup_file_watcher()
         self.frame_counter = 0
         self.previous_faces = []
+        self._frame_buffers = threading.local()
+        self.auto_harvest = config.AUTO_HARVEST if auto_harvest is None else auto_harvest
+        self.last_harvest = {}  # (category, name) -> time of the last harvested template
         
         # Initialize Cascade Classifier
         cascade_path = os.path.join(os.path.dirname(__file__), 'models', 'haarcascade_frontalface_default.xml')
@@ -192,39 +310,49 @@ class FaceRecognitionSystem:
 
     def setup_gender_model(self):
         # Gender detection model initialization
-        model_dir = os.path.join(os.path.dirname(__file__), 'models')
-        self.gender_net = cv2.dnn.readNetFromCaffe(
-            os.path.join(model_dir, 'deploy_gender.prototxt'),
-            os.path.join(model_dir, 'gender_net.caffemodel')
-        )
         self.gender_list = ['Male', 'Female']
+        if not os.path.exists(config.GENDER_MODEL_PATH):
+            print(f"⚠️ Gender model not found at {config.GENDER_MODEL_PATH}, gender detection disabled")
+            self.gender_net = None
+            return
+        self.gender_net = cv2.dnn.readNetFromCaffe(config.GENDER_PROTOTXT_PATH, config.GENDER_MODEL_PATH)
 
     def setup_file_watcher(self):
         """Set up watchers for the faces directories"""
         class FaceDirectoryHandler(FileSystemEventHandler):
-            def __init__(self, face_system):
-                self.face_system = face_system
+            def __init__(self, reloader):
+                self.reloader = reloader
+
+            def changed(self, path):
+                thumbnail_cache.invalidate(path)
+                self.reloader.touch(path)
 
             def on_created(self, event):
-                if not event.is_directory and event.src_path.lower().endswith(('.png', '.jpg', '.jpeg')):
-                    print(f"🔄 New face image detected: {event.src_path}")
-                    self.face_system.update_single_face(event.src_path)
+                if not event.is_directory and is_face_image(event.src_path):
+                    self.changed(event.src_path)
 
             def on_modified(self, event):
-                if not event.is_directory and event.src_path.lower().endswith(('.png', '.jpg', '.jpeg')):
-                    print(f"🔄 Face image modified: {event.src_path}")
-                    self.face_system.update_single_face(event.src_path)
+                if not event.is_directory and is_face_image(event.src_path):
+                    self.changed(event.src_path)
 
             def on_deleted(self, event):
-                if not event.is_directory and event.src_path.lower().endswith(('.png', '.jpg', '.jpeg')):
-                    print(f"🗑️ Face image deleted: {event.src_path}")
-                    self.face_system.remove_face(event.src_path)
+                if not event.is_directory and is_face_image(event.src_path):
+                    self.changed(event.src_path)
 
-        event_handler = FaceDirectoryHandler(self)
+            def on_moved(self, event):
+                if event.is_directory:
+                    return
+                for path in (event.src_path, event.dest_path):
+                    if is_face_image(path):
+                        self.changed(path)
+
+        # A single copy fires several events; reload each file once after they settle
+        self.reloader = DebouncedReloader(self.reload_faces, delay=1.0, max_delay=5.0)
+        event_handler = FaceDirectoryHandler(self.reloader)
         observer = Observer()
         
-        for category in ['staff', 'customers']:
-            dir_path = os.path.join('faces', category)
+        for category in CATEGORIES:
+            dir_path = os.path.join(self.faces_dir, category)
             if os.path.exists(dir_path):
                 observer.schedule(event_handler, dir_path, recursive=False)
                 print(f"👀 Watching directory: {dir_path}")
@@ -232,158 +360,217 @@ class FaceRecognitionSystem:
         observer.start()
         print("✅ File watcher initialized")
 
-    def update_single_face(self, image_path):
-        """Update a single face in the system"""
-        try:
-            # Determine category from path
-            category = 'staff' if 'staff' in image_path else 'customers'
-            file = os.path.basename(image_path)
-            name = os.path.splitext(file)[0]
-            
-            # Load and encode the face
-            image = face_recognition.load_image_file(image_path)
-            encodings = face_recognition.face_encodings(image)
-            
-            if not encodings:
-                print(f"⚠️ No faces found in {file}")
-                return
-            
-            # Update the face data
-            target = self.staff_faces if category == 'staff' else self.known_faces
-            
-            # Remove existing face if present
-            target[:] = [face for face in target if face['name'] != name]
-            
-            # Add new face
-            target.append({
-                'name': name,
-                'encoding': encodings[0]
-            })
-            
-            # Update Firebase
-            existing_data = self.firebase_ref.child(category).child(name.lower().replace(' ', '_')).get() or {}
-            firebase_data = {
-                **existing_data,
-                'name': name,
-                'imagePath': f'/faces/{category}/{file}',
-                'lastUpdated': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            }
-            
-            if category == 'customers':
-                if 'visitCount' not in firebase_data:
-                    firebase_data['visitCount'] = 0
-                if 'lastVisit' not in firebase_data:
-                    firebase_data['lastVisit'] = None
-            else:
-                if 'lastVisit' not in firebase_data:
-                    firebase_data['lastVisit'] = None
-            
-            self.firebase_ref.child(category).child(name.lower().replace(' ', '_')).update(firebase_data)
-            print(f"✅ Updated face: {name}")
-            
-        except Exception as e:
-            print(f"❌ Error updating face {image_path}: {str(e)}")
-
-    def remove_face(self, image_path):
-        """Remove a face from the system"""
-        try:
-            category = 'staff' if 'staff' in image_path else 'customers'
-            file = os.path.basename(image_path)
-            name = os.path.splitext(file)[0]
-            
-            # Remove from memory
-            target = self.staff_faces if category == 'staff' else self.known_faces
-            target[:] = [face for face in target if face['name'] != name]
-            
-            # Remove from Firebase
-            self.firebase_ref.child(category).child(name.lower().replace(' ', '_')).delete()
-            print(f"✅ Removed face: {name}")
-            
-        except Exception as e:
-            print(f"❌ Error removing face {image_path}: {str(e)}")
+    def reload_faces(self, image_paths):
+        """Re-encode a batch of changed face files and swap them into the gallery"""
+        upserts = []
+        removals = []
+        profile_changes = {category: {} for category in CATEGORIES}
+        primaries = {category: {} for category in CATEGORIES}  # profile key -> (name, file) to sync
+        
+        # A primary that (re)appears brings in templates that were skipped while it was missing
+        image_paths = list(image_paths)
+        for image_path in list(image_paths):
+            template = os.path.splitext(os.path.basename(image_path))[0]
+            if template == identity_name(template) and os.path.exists(image_path):
+                image_paths.extend(path for path in template_paths(image_path, template)
+                                   if path not in self.face_modification_times and path not in image_paths)
+        
+        for image_path in image_paths:
+            try:
+                # The category is the directory the file is in, not a substring of its path
+                category = os.path.basename(os.path.dirname(image_path))
+                if category not in CATEGORIES:
+                    continue
+                file = os.path.basename(image_path)
+                template = os.path.splitext(file)[0]
+                name = identity_name(template)
+                # Extra templates (name@suffix.jpg) only change the gallery; the profile follows name.jpg
+                is_primary = template == name
+                key = profile_key(name)
+                
+                if not os.path.exists(image_path):
+                    self.face_modification_times.pop(image_path, None)
+                    removals.append((category, template))
+                    if is_primary:
+                        profile_changes[category][key] = None
+                        # Without its primary image the identity is not matched; the template files
+                        # stay on disk (a rename moves them along) and come back with the primary
+                        removals.extend((category, extra) for extra in self.gallery.snapshot(category).template_keys(name))
+                        for extra_path in template_paths(image_path, name):
+                            self.face_modification_times.pop(extra_path, None)
+                    print(f"🗑️ Face image deleted: {file}")
+                    continue
+                
+                if not is_primary and not has_primary_image(os.path.dirname(image_path), name):
+                    continue
+                
+                # Skip files whose contents were already encoded
+                stat = os.stat(image_path)
+                signature = (stat.st_mtime, stat.st_size)
+                if self.face_modification_times.get(image_path) == signature:
+                    continue
+                
+                image = face_recognition.load_image_file(image_path)
+                encodings = face_recognition.face_encodings(image)
+                self.face_modification_times[image_path] = signature
+                
+                if not encodings:
+                    print(f"⚠️ No faces found in {file}")
+                    continue
+                
+                upserts.append((category, template, encodings[0]))
+                if is_primary:
+                    primaries[category][key] = (name, file)
+                print(f"🔄 Reloaded face: {template}")
+                
+            except Exception as e:
+                print(f"❌ Error updating face {image_path}: {str(e)}")
+        
+        if upserts or removals:
+            self.gallery.apply(upserts, removals)
+        
+        # One profile read per category for the whole batch, as in sync_profiles
+        for category, files in primaries.items():
+            if not files:
+                continue
+            try:
+                existing_profiles = self.store.get_profiles(category)
+            except Exception as e:
+                print(f"❌ Error reading {category} profiles: {str(e)}")
+                continue
+            for key, (name, file) in files.items():
+                existing_data = existing_profiles.get(key)
+                if not isinstance(existing_data, dict):
+                    existing_data = {}
+                profile_changes[category][key] = profile_sync_fields(category, name, file, existing_data)
+        
+        for category, changes in profile_changes.items():
+            if not changes:
+                continue
+            try:
+                self.store.update_profiles(category, changes)
+            except Exception as e:
+                print(f"❌ Error syncing reloaded {category} profiles: {str(e)}")
+        
+        if upserts or removals:
+            print(f"✅ Gallery updated: {len(upserts)} added/changed, {len(removals)} removed")
 
     def load_face_data(self):
         """Initial load of all face data"""
         print("Loading face data...")
         
         # Clear existing face data
-        self.known_faces = []
-        self.staff_faces = []
         self.face_modification_times = {}
         
         # Initialize visits if not exists
-        visits_ref = self.firebase_ref.child('visits')
-        if not visits_ref.get():
-            initial_visits = {
-                'init': {
-                    'name': 'System',
-                    'category': 'system',
-                    'time': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    'type': 'System Initialization'
-                }
-            }
-            visits_ref.set(initial_visits)
-            print("✅ Initialized visits node in Firebase")
+        if not self.store.has_visits():
+            self.store.add_visit({
+                'name': 'System',
+                'category': 'system',
+                'time': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                'type': 'System Initialization'
+            }, key='init')
+            print("✅ Initialized visits node")
         
-        for category in ['staff', 'customers']:
-            dir_path = os.path.join('faces', category)
+        entries = {category: {} for category in CATEGORIES}
+        image_files = {category: {} for category in CATEGORIES}
+        listings = {}
+        for category in CATEGORIES:
+            dir_path = os.path.join(self.faces_dir, category)
             if not os.path.exists(dir_path):
                 print(f"⚠️ Missing directory: {dir_path}")
                 continue
-
+            files = [file for file in os.listdir(dir_path) if is_face_image(file)]
+            # Templates are only matched with their identity's primary image, as on reload
+            primaries = {os.path.splitext(file)[0] for file in files if TEMPLATE_SEPARATOR not in file}
+            listings[category] = []
+            for file in files:
+                name = identity_name(os.path.splitext(file)[0])
+                if name in primaries:
+                    listings[category].append(file)
+                else:
+                    print(f"⚠️ Skipping {file}: {name} has no primary image")
+        
+        total = sum(len(files) for files in listings.values())
+        done = 0
+        for category, files in listings.items():
+            dir_path = os.path.join(self.faces_dir, category)
             print(f"🔍 Scanning {dir_path}...")
-            for file in os.listdir(dir_path):
-                if file.lower().endswith(('.png', '.jpg', '.jpeg')):
-                    try:
-                        image_path = os.path.join(dir_path, file)
-                        # Store modification time
-                        self.face_modification_times[image_path] = os.path.getmtime(image_path)
-                        
-                        image = face_recognition.load_image_file(image_path)
-                        encodings = face_recognition.face_encodings(image)
-                        if encodings:
-                            name = os.path.splitext(file)[0]
-                            
-                            target = self.staff_faces if category == 'staff' else self.known_faces
-                            target.append({
-                                'name': name,
-                                'encoding': encodings[0]
-                            })
-                            
-                            # Get existing data to preserve other fields
-                            existing_data = self.firebase_ref.child(category).child(name.lower().replace(' ', '_')).get() or {}
-                            
-                            firebase_data = {
-                                **existing_data,
-                                'name': name,
-                                'imagePath': f'/faces/{category}/{file}',
-                                'lastUpdated': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                            }
-                            
-                            # Set default values only if they don't exist
-                            if category == 'customers':
-                                if 'visitCount' not in firebase_data:
-                                    firebase_data['visitCount'] = 0
-                                if 'lastVisit' not in firebase_data:
-                                    firebase_data['lastVisit'] = None
-                            else:
-                                if 'lastVisit' not in firebase_data:
-                                    firebase_data['lastVisit'] = None
-                            
-                            self.firebase_ref.child(category).child(name.lower().replace(' ', '_')).update(firebase_data)
-                            print(f"✅ Loaded and saved {file}")
-                        else:
-                            print(f"⚠️ No faces found in {file}")
-                    except Exception as e:
-                        print(f"❌ Error loading {file}: {str(e)}")
+            for file in files:
+                done += 1
+                if self.on_progress:
+                    self.on_progress(done, total)
+                try:
+                    image_path = os.path.join(dir_path, file)
+                    # Store modification time
+                    stat = os.stat(image_path)
+                    self.face_modification_times[image_path] = (stat.st_mtime, stat.st_size)
+                    
+                    image = face_recognition.load_image_file(image_path)
+                    encodings = face_recognition.face_encodings(image)
+                    if encodings:
+                        template = os.path.splitext(file)[0]
+                        name = identity_name(template)
+                        entries[category][template] = encodings[0]
+                        if template == name:
+                            image_files[category][name] = file
+                        print(f"✅ Loaded {file}")
+                    else:
+                        print(f"⚠️ No faces found in {file}")
+                except Exception as e:
+                    print(f"❌ Error loading {file}: {str(e)}")
+
+        self.gallery.replace_all(entries)
+        self.sync_profiles(image_files)
+        print(f"\n📊 Loaded {self.gallery.count('staff')} staff and {self.gallery.count('customers')} customers")
 
-        print(f"\n📊 Loaded {len(self.staff_faces)} staff and {len(self.known_faces)} customers")
+    def sync_profiles(self, image_files):
+        """Bring stored profiles in line with the gallery using one read and one write per category"""
+        synced = 0
+        for category in CATEGORIES:
+            if not image_files[category]:
+                continue
+            try:
+                existing_profiles = self.store.get_profiles(category)
+            except Exception as e:
+                print(f"❌ Error reading {category} profiles: {str(e)}")
+                continue
+            
+            changes = {}
+            for name, file in image_files[category].items():
+                key = profile_key(name)
+                existing_data = existing_profiles.get(key)
+                if not isinstance(existing_data, dict):
+                    existing_data = {}
+                fields = profile_sync_fields(category, name, file, existing_data)
+                # Profiles already pointing at the right image are left untouched
+                if all(existing_data.get(field) == value for field, value in fields.items() if field != 'lastUpdated'):
+                    continue
+                changes[key] = fields
+            
+            if not changes:
+                continue
+            try:
+                self.store.update_profiles(category, changes)
+                synced += len(changes)
+            except Exception as e:
+                print(f"❌ Error syncing {category} profiles: {str(e)}")
+        
+        print(f"✅ Synced {synced} profiles" if synced else "✅ Profiles already up to date")
+
+    def warm_up(self):
+        """Run each model once so the first real frame doesn't pay for lazy initialization"""
+        frame = np.zeros((480, 640, 3), dtype=np.uint8)
+        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        face_recognition.face_locations(rgb_frame, model="hog")
+        face_recognition.face_encodings(rgb_frame, [(100, 300, 300, 100)])
+        self.detect_gender(frame[100:300, 100:300])
+        self.gallery.snapshot('customers').best_match(np.zeros(128), tolerance=0.4)
 
     def should_log_visit(self, name: str, category: str) -> bool:
         """Check if a visit should be logged based on time constraints"""
         try:
-            ref = self.firebase_ref.child(category).child(name.lower().replace(' ', '_'))
-            data = ref.get()
+            data = self.store.get_profile(category, profile_key(name))
             
             if not data:
                 return True
@@ -406,7 +593,7 @@ class FaceRecognitionSystem:
                 return time_diff > timedelta(seconds=2)
                 
         except Exception as e:
-            print(f"Error checking visit time: {str(e)}")
+            logger.error(f"Error checking visit time: {str(e)}")
             return True
 
     def detect_faces_cascade(self, frame):
@@ -421,29 +608,56 @@ class FaceRecognitionSystem:
         )
         return faces
 
-    def process_frame(self, frame):
-        """Process a single frame for face recognition"""
-        # Skip every other frame
+    def process_frame(self, frame, skip_alternate=True, source='default', frame_valid=None):
+        """Process a single frame for face recognition.
+
+        frame_valid is checked once the frame has been copied into this thread's buffers; if it
+        reports the frame was overwritten during the copy (a lapped ring slot), returns None.
+        """
+        # Skip every other frame, unless the caller already drops frames while we are busy
         self.frame_counter += 1
-        if self.frame_counter % 2 != 0:
+        if skip_alternate and self.frame_counter % 2 != 0:
+            metrics.FRAMES_TOTAL.inc(result='skipped')
             return []
 
+        with metrics.FRAME_SECONDS.time():
+            detections = self._process_frame(frame, source, frame_valid)
+        if detections is None:
+            metrics.FRAMES_TOTAL.inc(result='torn')
+            return None
+        metrics.FRAMES_TOTAL.inc(result='processed')
+        return detections
+
+    def _process_frame(self, frame, source='default', frame_valid=None):
         # Reduce resolution for faster processing
-        frame = cv2.resize(frame, (640, 480))
-        
-        # Convert to RGB for face_recognition
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        with stage('resize'):
+            # Resize and convert into this thread's reusable buffers instead of new arrays per frame
+            buffers = self._frame_buffers
+            if not hasattr(buffers, 'small'):
+                buffers.small = np.empty((480, 640, 3), dtype=np.uint8)
+                buffers.rgb = np.empty((480, 640, 3), dtype=np.uint8)
+            frame = cv2.resize(frame, (640, 480), dst=buffers.small)
+            
+            # Convert to RGB for face_recognition
+            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=buffers.rgb)
+        # Only the resize reads the caller's frame; after it, a lapped slot no longer matters
+        if frame_valid is not None and not frame_valid():
+            return None
         
         # Detect faces using face_recognition library
-        face_locations = face_recognition.face_locations(rgb_frame, model="hog")
+        with stage('detect'):
+            face_locations = face_recognition.face_locations(rgb_frame, model="hog")
         
         # Get face encodings
-        face_encodings = face_recognition.face_encodings(rgb_frame, face_locations, num_jitters=2)
+        with stage('encode'):
+            face_encodings = face_recognition.face_encodings(rgb_frame, face_locations, num_jitters=2)
         
         # Store current faces for next frame
         self.previous_faces = face_locations
         
-        self.firebase_ref.child('currentDetections').delete()
+        # Take the gallery snapshots once so a concurrent reload can't change them mid-frame
+        staff_gallery = self.gallery.snapshot('staff')
+        customer_gallery = self.gallery.snapshot('customers')
         
         detections = []
         for idx, (top, right, bottom, left) in enumerate(face_locations):
@@ -464,12 +678,13 @@ class FaceRecognitionSystem:
                 }
 
                 # Check staff first with increased tolerance
-                matches = face_recognition.compare_faces([sf['encoding'] for sf in self.staff_faces], face_encoding, tolerance=0.4)
-                if True in matches:
-                    staff_index = matches.index(True)
-                    system_name = self.staff_faces[staff_index]['name']
-                    # Get the original name from Firebase
-                    staff_data = self.firebase_ref.child('staff').child(system_name.lower().replace(' ', '_')).get()
+                with stage('match'):
+                    match = staff_gallery.match(face_encoding)
+                system_name = match.name if match is not None and match.distance <= 0.4 else None
+                if system_name is not None:
+                    self.harvest_template('staff', match, frame, (top, right, bottom, left))
+                    # Get the original name from the datastore
+                    staff_data = self.store.get_profile('staff', profile_key(system_name))
                     display_name = staff_data.get('name') if staff_data and staff_data.get('name') else system_name
                     greeting = f"Hello {display_name}, welcome back to AstroNova!"
                     detection.update({
@@ -480,18 +695,19 @@ class FaceRecognitionSystem:
                     
                     if self.should_log_visit(system_name, 'staff'):
                         self.log_visit(display_name, 'staff')
-                        self.firebase_ref.child('staff').child(system_name.lower().replace(' ', '_')).update({
+                        self.store.update_profile('staff', profile_key(system_name), {
                             'lastVisit': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
                             'name': display_name
                         })
                 else:
                     # Then check customers with increased tolerance
-                    matches = face_recognition.compare_faces([cf['encoding'] for cf in self.known_faces], face_encoding, tolerance=0.4)
-                    if True in matches:
-                        customer_index = matches.index(True)
-                        system_name = self.known_faces[customer_index]['name']
-                        # Get the original name from Firebase
-                        customer_data = self.firebase_ref.child('customers').child(system_name.lower().replace(' ', '_')).get()
+                    with stage('match'):
+                        match = customer_gallery.match(face_encoding)
+                    system_name = match.name if match is not None and match.distance <= 0.4 else None
+                    if system_name is not None:
+                        self.harvest_template('customers', match, frame, (top, right, bottom, left))
+                        # Get the original name from the datastore
+                        customer_data = self.store.get_profile('customers', profile_key(system_name))
                         display_name = customer_data.get('name') if customer_data and customer_data.get('name') else system_name
                         greeting = f"Hello {display_name}, welcome back to AstroNova!"
                         detection.update({
@@ -502,17 +718,15 @@ class FaceRecognitionSystem:
                         
                         if self.should_log_visit(system_name, 'customers'):
                             self.log_visit(display_name, 'customer')
-                            customer_ref = self.firebase_ref.child('customers').child(system_name.lower().replace(' ', '_'))
-                            current_visits = customer_ref.child('visitCount').get() or 0
-                            customer_ref.update({
+                            current_visits = (customer_data or {}).get('visitCount') or 0
+                            self.store.update_profile('customers', profile_key(system_name), {
                                 'visitCount': current_visits + 1,
                                 'lastVisit': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
                                 'name': display_name
                             })
                     else:
                         # For unknown faces, detect gender and check cooldown
-                        unknown_ref = self.firebase_ref.child('unknown_visitors')
-                        last_unknown_greeting = unknown_ref.child('last_greeting').get()
+                        last_unknown_greeting = self.store.get_last_unknown_greeting()
                         current_time = datetime.now()
                         should_greet = True
 
@@ -521,7 +735,8 @@ class FaceRecognitionSystem:
                             if (current_time - last_time) < timedelta(seconds=2):
                                 should_greet = False
 
-                        gender = self.detect_gender(face_img)
+                        with stage('gender'):
+                            gender = self.detect_gender(face_img)
                         honorific = "ma'am" if gender == "Female" else "sir"
                         greeting = f"Welcome to AstroNova, {honorific}! How may we assist you today?" if should_greet else ""
                         
@@ -534,15 +749,13 @@ class FaceRecognitionSystem:
                         
                         if should_greet:
                             # Update last greeting time and log visit
-                            unknown_ref.update({
-                                'last_greeting': current_time.strftime("%Y-%m-%d %H:%M:%S")
-                            })
+                            self.store.set_last_unknown_greeting(current_time.strftime("%Y-%m-%d %H:%M:%S"))
                             self.log_visit('Unknown', 'unknown')
                             
                             # Extract and save unknown face after greeting
                             try:
                                 # Create extracted_faces directory if it doesn't exist
-                                extracted_faces_dir = os.path.join('faces', 'extracted_faces')
+                                extracted_faces_dir = os.path.join(self.faces_dir, 'extracted_faces')
                                 os.makedirs(extracted_faces_dir, exist_ok=True)
                                 
                                 # Generate filename with timestamp
@@ -553,20 +766,48 @@ class FaceRecognitionSystem:
                                 # Save the face image
                                 success = cv2.imwrite(filepath, face_img)
                                 if success:
-                                    print(f"✅ Saved unknown face to {filepath}")
+                                    logger.info(f"✅ Saved unknown face to {filepath}")
                                     detection['imageSrc'] = f"/faces/extracted_faces/{filename}"
                                 else:
-                                    print(f"❌ Failed to save unknown face to {filepath}")
+                                    logger.error(f"❌ Failed to save unknown face to {filepath}")
                             except Exception as e:
-                                print(f"❌ Error saving unknown face: {str(e)}")
+                                logger.error(f"❌ Error saving unknown face: {str(e)}")
                 
+                metrics.FACES_TOTAL.inc(type=detection['type'])
                 detections.append(detection)
-                self.firebase_ref.child('currentDetections').child(str(idx)).set(detection)
         
+        # Local displays get deltas pushed; the datastore copy is opt-in and only written on change
+        changed = self.detection_feed.publish(source, detections)
+        if changed and config.DETECTIONS_TO_DATASTORE:
+            self.store.set_current_detections(detections)
         return detections
 
+    def harvest_template(self, category, match, frame, location):
+        """Save a confidently recognized live face as an extra template of that identity.
+
+        Only matches that are confident but not near-duplicates of an existing template are kept,
+        at most one per identity per HARVEST_INTERVAL; the file watcher encodes them.
+        """
+        if not self.auto_harvest or match.templates >= config.HARVEST_MAX_TEMPLATES:
+            return
+        if not config.HARVEST_MIN_DISTANCE <= match.distance <= config.HARVEST_MAX_DISTANCE:
+            return
+        now = time.time()
+        if now - self.last_harvest.get((category, match.name), 0) < config.HARVEST_INTERVAL:
+            return
+        self.last_harvest[(category, match.name)] = now
+        
+        # Keep some margin around the face so it is detected again when the template is encoded
+        top, right, bottom, left = location
+        margin = (bottom - top) // 3
+        height, width = frame.shape[:2]
+        crop = frame[max(top - margin, 0):min(bottom + margin, height), max(left - margin, 0):min(right + margin, width)]
+        filename = f"{match.name}{TEMPLATE_SEPARATOR}live-{datetime.now().strftime('%Y%m%d_%H%M%S')}.jpg"
+        if cv2.imwrite(os.path.join(self.faces_dir, category, filename), crop):
+            logger.info(f"📸 Harvested template {filename} (distance {match.distance:.3f})")
+
     def log_visit(self, display_name, category):
-        """Log a visit to Firebase"""
+        """Log a visit to the local visit log, replicated to the datastore in the background"""
         visit_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         visit_data = {
             'name': display_name,
@@ -574,10 +815,12 @@ class FaceRecognitionSystem:
             'time': visit_time,
             'type': 'Unknown' if category == 'unknown' else 'Recognized'
         }
-        self.firebase_ref.child('visits').push().set(visit_data)
+        self.visit_log.append(visit_data)
 
     def detect_gender(self, face_img):
         """Detect gender from face image"""
+        if self.gender_net is None:
+            return None
         try:
             # Preprocess the face image
             blob = cv2.dnn.blobFromImage(face_img, 1.0, (227, 227), 
@@ -591,76 +834,72 @@ class FaceRecognitionSystem:
             
             return gender
         except Exception as e:
-            print(f"Error detecting gender: {str(e)}")
+            logger.error(f"Error detecting gender: {str(e)}")
             return None
 
 @app.route('/process-frame', methods=['POST'])
+@requires_system
 def process_frame():
     try:
         data = request.get_json()
         image_data = data['image'].split(',')[1]
         
-        nparr = np.frombuffer(base64.b64decode(image_data), np.uint8)
-        frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        with stage('decode'):
+            nparr = np.frombuffer(base64.b64decode(image_data), np.uint8)
+            frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
         
-        detections = system.process_frame(frame)
+        detections = system.process_frame(frame, source=data.get('source', 'default'))
         
         return jsonify({'status': 'success', 'detections': detections})
     except Exception as e:
+        logger.error(f"Error in process-frame: {str(e)}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
 @app.route('/process-ip-camera', methods=['POST'])
+@requires_system
 def process_ip_camera():
     try:
         data = request.get_json()
         ip_camera_url = data.get('camera_url')
         
-        print(f"\n🔍 Attempting to connect to IP camera...")
-        print(f"📹 Camera URL: {ip_camera_url}")
+        logger.debug(f"🔍 Attempting to connect to IP camera: {ip_camera_url}")
         
         if not ip_camera_url:
-            print("❌ Error: Camera URL is required")
+            logger.warning("❌ Error: Camera URL is required")
             return jsonify({'status': 'error', 'message': 'Camera URL is required'}), 400
             
         # Decode the URL
         ip_camera_url = urllib.parse.unquote(ip_camera_url)
-        print(f"🔗 Decoded URL: {ip_camera_url}")
+        logger.debug(f"🔗 Decoded URL: {ip_camera_url}")
             
         # Open the IP camera stream
-        print("🔄 Opening camera stream...")
-        cap = cv2.VideoCapture(ip_camera_url)
+        with stage('capture'):
+            cap = cv2.VideoCapture(ip_camera_url)
         
         if not cap.isOpened():
-            print("❌ Error: Failed to open IP camera stream")
+            logger.error("❌ Error: Failed to open IP camera stream")
             return jsonify({'status': 'error', 'message': 'Failed to open IP camera stream'}), 500
             
-        print("✅ Camera stream opened successfully")
-            
         # Read a frame
-        print("📸 Attempting to read frame...")
-        ret, frame = cap.read()
+        with stage('capture'):
+            ret, frame = cap.read()
         if not ret:
-            print("❌ Error: Failed to read frame from IP camera")
+            logger.error("❌ Error: Failed to read frame from IP camera")
             cap.release()
             return jsonify({'status': 'error', 'message': 'Failed to read frame from IP camera'}), 500
             
-        print("✅ Frame read successfully")
-            
         # Process the frame
-        print("🔄 Processing frame...")
         detections = system.process_frame(frame)
-        print(f"✅ Frame processed. Found {len(detections)} faces")
+        logger.debug(f"✅ Frame processed. Found {len(detections)} faces")
         
         # Release the camera
         cap.release()
-        print("🔒 Camera released")
         
         return jsonify({'status': 'success', 'detections': detections})
     except Exception as e:
-        print(f"❌ Error in process_ip_camera: {str(e)}")
+        logger.error(f"❌ Error in process_ip_camera: {str(e)}")
         if 'cap' in locals():
             cap.release()
-            print("🔒 Camera released after error")
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
 @app.route('/extract-face', methods=['POST'])
@@ -698,10 +937,10 @@ def extract_face():
         # Save the face image
         success = cv2.imwrite(filepath, face_img)
         if not success:
-            print(f"Failed to save image to {filepath}")
+            logger.error(f"Failed to save image to {filepath}")
             return jsonify({'status': 'error', 'message': 'Failed to save image'}), 500
             
-        print(f"Successfully saved face image to {filepath}")
+        logger.debug(f"Successfully saved face image to {filepath}")
         
         # Return the URL path to access the image
         image_url = f"/faces/extracted_faces/{filename}"
@@ -717,14 +956,20 @@ def extract_face():
 
 @app.route('/faces/<path:filename>')
 def serve_face(filename):
+    """A face image, or with ?size=N a cached variant whose longer side is about N pixels"""
+    try:
+        size = int(request.args.get('size', 0))
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'size must be an integer'}), 400
     try:
-        # Get the current directory where main.py is located
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        print(f"Serving file: {filename} from directory: {current_dir}")
-        return send_from_directory(os.path.join(current_dir, 'faces'), filename)
+        path, etag, mtime = thumbnail_cache.lookup(filename, size)
+    except FileNotFoundError:
+        return jsonify({'status': 'error', 'message': 'Face image not found'}), 404
     except Exception as e:
-        print(f"Error serving face image: {str(e)}")
-        return jsonify({'status': 'error', 'message': str(e)}), 404
+        logger.warning(f"Error serving face image {filename}: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+    # Revalidates with If-None-Match / If-Modified-Since and answers 304 when unchanged
+    return send_file(path, etag=etag, last_modified=mtime, max_age=config.FACES_MAX_AGE, conditional=True)
 
 @app.route('/faces/extracted/list')
 def list_extracted_faces():
@@ -750,20 +995,40 @@ def list_extracted_faces():
         print(f"Error listing faces: {str(e)}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
-# Create faces directories if they don't exist
-os.makedirs('faces/staff', exist_ok=True)
-os.makedirs('faces/customers', exist_ok=True)
-os.makedirs('models', exist_ok=True)
+@app.route('/visits/stats')
+@requires_system
+def visit_stats():
+    try:
+        end = parse_day(request.args.get('end'), date.today())
+        start = parse_day(request.args.get('start'), end - timedelta(days=6))
+        category = parse_category(request.args.get('category'))
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'Dates must be YYYY-MM-DD and category staff, customers or unknown'}), 400
+    if start > end or (end - start).days > 3660:
+        return jsonify({'status': 'error', 'message': 'Invalid date range'}), 400
+    
+    try:
+        stats = system.visit_log.stats(start, end, category=category)
+        return jsonify({'status': 'success', 'start': start.isoformat(), 'end': end.isoformat(), **stats})
+    except Exception as e:
+        print(f"Error computing visit stats: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
 
-try:
-    system = FaceRecognitionSystem()
+@app.route('/visits')
+@requires_system
+def list_visits():
+    try:
+        day = parse_day(request.args.get('date'), date.today())
+        category = parse_category(request.args.get('category'))
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'Date must be YYYY-MM-DD and category staff, customers or unknown'}), 400
     
-    if __name__ == "__main__":
-        app.run(port=5000)
-        
-except Exception as e:
-    print(f"Failed to initialize system: {str(e)}")
-    raise
+    try:
+        visits = system.visit_log.records(day, category=category)
+        return jsonify({'status': 'success', 'date': day.isoformat(), 'visits': visits})
+    except Exception as e:
+        print(f"Error listing visits: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
 
 def cleanup_old_faces():
     """Clean up faces older than 24 hours"""
@@ -781,6 +1046,7 @@ def cleanup_old_faces():
                     if current_time - file_time > 24 * 60 * 60:  # 24 hours in seconds
                         try:
                             os.remove(filepath)
+                            thumbnail_cache.invalidate(filepath)
                             print(f"✅ Removed old face image: {filename}")
                         except Exception as e:
                             print(f"❌ Error removing {filename}: {str(e)}")
@@ -790,6 +1056,88 @@ def cleanup_old_faces():
             print(f"❌ Error in cleanup thread: {str(e)}")
             time.sleep(3600)  # Retry after an hour if there's an error
 
-# Start cleanup thread when app starts
-cleanup_thread = threading.Thread(target=cleanup_old_faces, daemon=True)
-cleanup_thread.start()
\ No newline at end of file
+def bootstrap():
+    """Load models and the gallery, then publish the system; runs on the startup thread"""
+    global system
+    try:
+        startup.set_stage('datastore')
+        store = create_store()
+        
+        startup.set_stage('models')
+        # Download cascade classifier before initializing the system
+        if not download_cascade_classifier():
+            print("⚠️ Cascade classifier not available, face detection may be slower")
+        face_system = FaceRecognitionSystem(store=store, load_faces=False, watch_files=False,
+                                            on_progress=startup.set_progress, detection_feed=detection_feed)
+        
+        startup.set_stage('gallery')
+        face_system.load_face_data()
+        
+        startup.set_stage('warmup')
+        face_system.warm_up()
+        face_system.setup_file_watcher()
+        
+        system = face_system
+        startup.mark_ready()
+    except Exception as e:
+        logger.exception("Failed to initialize system")
+        startup.fail(e)
+
+def bootstrap_worker(control_name, worker_id):
+    """Startup for a serving worker: the gallery is attached from shared memory, not loaded"""
+    global system
+    from shared_gallery import SharedGalleryReader
+    try:
+        startup.set_stage('datastore')
+        store = create_store(sync=False)
+        
+        startup.set_stage('models')
+        download_cascade_classifier()
+        
+        startup.set_stage('gallery')
+        gallery = SharedGalleryReader(control_name)
+        while not gallery.wait_for_gallery(timeout=5):
+            print(f"⏳ Worker {worker_id} waiting for the gallery owner")
+        
+        visit_log = VisitLog(replicate_to=store if config.VISIT_REPLICATION else None, writer=f'w{worker_id}')
+        face_system = FaceRecognitionSystem(store=store, visit_log=visit_log, gallery=gallery,
+                                            load_faces=False, watch_files=False, detection_feed=detection_feed)
+        
+        startup.set_stage('warmup')
+        face_system.warm_up()
+        
+        system = face_system
+        startup.mark_ready()
+    except Exception as e:
+        logger.exception("Failed to initialize worker")
+        startup.fail(e)
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=os.environ.get('NOVA_LOG_LEVEL', 'INFO').upper(),
+        format='%(asctime)s %(levelname)s %(threadName)s %(message)s'
+    )
+    
+    # Create faces directories if they don't exist
+    os.makedirs('faces/staff', exist_ok=True)
+    os.makedirs('faces/customers', exist_ok=True)
+    os.makedirs('models', exist_ok=True)
+    
+    if config.WORKERS > 1:
+        import serving
+        serving.serve(config.WORKERS, config.FLASK_HOST, config.FLASK_PORT)
+        raise SystemExit(0)
+    
+    if config.LAZY_STARTUP:
+        # Serve /health and /ready straight away and finish initializing in the background
+        threading.Thread(target=bootstrap, name='startup', daemon=True).start()
+    else:
+        bootstrap()
+        if startup.error:
+            raise SystemExit(1)
+    
+    # Start cleanup thread when app starts
+    cleanup_thread = threading.Thread(target=cleanup_old_faces, daemon=True)
+    cleanup_thread.start()
+    
+    app.run(port=5000)
@@ -0,0 +1,266 @@
+"""In-process counters and histograms rendered in the Prometheus text format.
+
+Every thread records into its own shard, so the hot path never takes a lock; shards are only
+summed when /metrics is scraped. Shards of finished threads (werkzeug starts one per request)
+are folded into a retired total whenever the shard list grows past REAP_THRESHOLD, and at scrape
+time, so they don't accumulate when nothing scrapes.
+
+With several serving processes each one also writes its totals to a MetricsSpool file every few
+seconds, and /metrics on any of them renders the sum of its own live totals and the others' files.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+REAP_THRESHOLD = 64  # shards before a new thread's first write folds in the finished ones
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards = []  # (thread, {label values: values})
+        self._retired = {}
+        self._reap_at = REAP_THRESHOLD
+        self._lock = threading.Lock()
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = {}
+            self._local.shard = shard
+            with self._lock:
+                if len(self._shards) >= self._reap_at:
+                    self._reap()
+                    # Many live threads: wait for as many again before the next pass
+                    self._reap_at = max(REAP_THRESHOLD, 2 * len(self._shards))
+                self._shards.append((threading.current_thread(), shard))
+        return shard
+
+    def _reap(self):
+        """Fold shards of finished threads into the retired totals; caller holds the lock"""
+        live = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                live.append((thread, shard))
+            else:
+                for key, values in shard.items():
+                    self._merge(self._retired.setdefault(key, self._empty()), values)
+        self._shards = live
+
+    def _label_values(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def _merge(self, into, values):
+        raise NotImplementedError
+
+    def collect(self):
+        """Sum every shard into {label values: values}"""
+        with self._lock:
+            self._reap()
+            totals = {key: list(values) for key, values in self._retired.items()}
+            for _, shard in self._shards:
+                for key, values in list(shard.items()):
+                    self._merge(totals.setdefault(key, self._empty()), values)
+        return totals
+
+    def _empty(self):
+        raise NotImplementedError
+
+    def _format_labels(self, values, extra=()):
+        pairs = list(zip(self.labelnames, values)) + list(extra)
+        if not pairs:
+            return ''
+        escaped = (f'{name}="{escape_label(value)}"' for name, value in pairs)
+        return '{' + ','.join(escaped) + '}'
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        shard = self._shard()
+        key = self._label_values(labels)
+        values = shard.get(key)
+        if values is None:
+            shard[key] = [amount]
+        else:
+            values[0] += amount
+
+    def _empty(self):
+        return [0]
+
+    def _merge(self, into, values):
+        into[0] += values[0]
+
+    def render(self, totals):
+        lines = []
+        for key, values in sorted(totals.items()):
+            lines.append(f'{self.name}{self._format_labels(key)} {values[0]}')
+        return lines
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        shard = self._shard()
+        key = self._label_values(labels)
+        values = shard.get(key)
+        if values is None:
+            values = self._empty()
+            shard[key] = values
+        # Layout: one slot per bucket (non-cumulative), then +Inf, sum and count
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                values[i] += 1
+                break
+        else:
+            values[len(self.buckets)] += 1
+        values[-2] += value
+        values[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _empty(self):
+        return [0] * (len(self.buckets) + 3)
+
+    def _merge(self, into, values):
+        for i, value in enumerate(values):
+            into[i] += value
+
+    def render(self, totals):
+        lines = []
+        for key, values in sorted(totals.items()):
+            cumulative = 0
+            for i, bound in enumerate(self.buckets):
+                cumulative += values[i]
+                lines.append(f'{self.name}_bucket{self._format_labels(key, [("le", repr(bound))])} {cumulative}')
+            cumulative += values[len(self.buckets)]
+            lines.append(f'{self.name}_bucket{self._format_labels(key, [("le", "+Inf")])} {cumulative}')
+            lines.append(f'{self.name}_sum{self._format_labels(key)} {values[-2]}')
+            lines.append(f'{self.name}_count{self._format_labels(key)} {values[-1]}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name, documentation, labelnames=()):
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def collect(self):
+        """{metric name: [[label values, values], ...]}, JSON-serializable"""
+        return {metric.name: [[list(key), values] for key, values in metric.collect().items()]
+                for metric in self._metrics}
+
+    def render(self, others=()):
+        """Prometheus text of this process's totals plus other processes' collect() results"""
+        lines = []
+        for metric in self._metrics:
+            totals = metric.collect()
+            for other in others:
+                for key, values in other.get(metric.name, ()):
+                    metric._merge(totals.setdefault(tuple(key), metric._empty()), values)
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.render(totals))
+        return '\n'.join(lines) + '\n'
+
+
+class MetricsSpool:
+    """Per-process metric totals in a directory shared by the serving processes"""
+
+    def __init__(self, directory, name, registry=None, interval=5.0):
+        self.directory = directory
+        self.name = name
+        self.registry = registry or REGISTRY
+        self.interval = interval
+        os.makedirs(directory, exist_ok=True)
+
+    def flush(self):
+        path = os.path.join(self.directory, f'{self.name}.json')
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.registry.collect(), f)
+        os.replace(tmp_path, path)
+
+    def start(self):
+        def flush_loop():
+            while True:
+                try:
+                    self.flush()
+                except Exception as e:
+                    print(f"❌ Error writing metrics spool: {str(e)}")
+                time.sleep(self.interval)
+
+        threading.Thread(target=flush_loop, name='metrics-spool', daemon=True).start()
+
+    def others(self):
+        """collect() results last written by the other processes"""
+        snapshots = []
+        for file in os.listdir(self.directory):
+            if not file.endswith('.json') or file == f'{self.name}.json':
+                continue
+            try:
+                with open(os.path.join(self.directory, file)) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                pass
+        return snapshots
+
+    def render(self):
+        return self.registry.render(self.others())
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+STAGE_SECONDS = REGISTRY.histogram(
+    'nova_stage_seconds', 'Time spent in each pipeline stage', ['stage'])
+FRAME_SECONDS = REGISTRY.histogram(
+    'nova_frame_seconds', 'End-to-end process_frame time for processed frames')
+FRAMES_TOTAL = REGISTRY.counter(
+    'nova_frames_total', 'Frames handed to process_frame', ['result'])
+FACES_TOTAL = REGISTRY.counter(
+    'nova_faces_total', 'Faces detected, by match type', ['type'])
+DATASTORE_SECONDS = REGISTRY.histogram(
+    'nova_datastore_seconds', 'Datastore call latency', ['operation'])
+DATASTORE_ERRORS_TOTAL = REGISTRY.counter(
+    'nova_datastore_errors_total', 'Datastore calls that raised', ['operation'])
+HTTP_REQUESTS_TOTAL = REGISTRY.counter(
+    'nova_http_requests_total', 'HTTP requests served', ['endpoint', 'status'])
+
+
+def stage(name):
+    """Context manager timing one pipeline stage"""
+    return STAGE_SECONDS.time(stage=name)
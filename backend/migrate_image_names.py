@@ -1,32 +1,29 @@
 import os
 import json
-import firebase_admin
-from firebase_admin import credentials, db
+import argparse
+from bisect import bisect_left
 from datetime import datetime
+from storage import create_store
+from gallery import TEMPLATE_SEPARATOR, identity_name
 
-# Initialize Firebase Admin SDK
-cred = credentials.Certificate('firebase-key.json')
-firebase_admin.initialize_app(cred, {
-    'databaseURL': 'https://nova-dristi-default-rtdb.firebaseio.com'
-})
+CATEGORIES = ['staff', 'customers']
+BASE_PATH = 'faces'
+PROGRESS_FILE = 'migration_progress.json'
+UPDATE_BATCH_SIZE = 500
 
-def generate_username(name: str, category: str, existing_username: str = None) -> str:
-    """Generate a consistent username from the given name."""
+def generate_username(name: str, existing_usernames: set, existing_username: str = None) -> str:
+    """Generate a consistent username from the given name and reserve it in existing_usernames."""
     # If there's an existing username and it's valid, use it
     if existing_username and all(c.isalnum() or c == '_' for c in existing_username.lower()):
-        return existing_username.lower()
+        username = existing_username.lower()
+        existing_usernames.add(username)
+        return username
 
     # Convert name to lowercase and replace spaces/special chars with underscore
     username = name.lower()
     username = ''.join(c for c in username if c.isalnum() or c.isspace())
     username = username.strip().replace(' ', '_')
 
-    # Get existing usernames from Firebase
-    existing_profiles = db.reference(f'/{category}').get() or {}
-    existing_usernames = {profile.get('systemName', '').lower()
-                         for profile in existing_profiles.values()
-                         if profile.get('systemName')}
-
     # If username is already taken, append numbers until we find a unique one
     final_username = username
     counter = 1
@@ -34,90 +31,297 @@ def generate_username(name: str, category: str, existing_username: str = None) -
         final_username = f"{username}_{counter}"
         counter += 1
 
+    existing_usernames.add(final_username)
     return final_username
 
-def migrate_image_names():
+class FileIndex:
+    """Case-insensitive lookups over the image files of one category directory"""
+
+    def __init__(self, files):
+        self.by_stem = {}
+        self.by_name = {}
+        for f in files:
+            if TEMPLATE_SEPARATOR in f:
+                continue  # extra templates (name@x.jpg) are never a profile's own image
+            self.by_stem.setdefault(os.path.splitext(f)[0].lower(), f)
+            self.by_name.setdefault(f.lower(), f)
+        self.sorted_names = sorted(self.by_name)
+        # Extra templates by the lower-cased stem of the primary image they belong to
+        self.templates = {}
+        self.all_names = {f.lower() for f in files}
+        for f in files:
+            if TEMPLATE_SEPARATOR in f:
+                self.templates.setdefault(identity_name(os.path.splitext(f)[0]).lower(), []).append(f)
+
+    def __contains__(self, filename):
+        return filename.lower() in self.by_name
+
+    def find_by_stem(self, stem):
+        return self.by_stem.get(stem.lower())
+
+    def find_by_name(self, filename):
+        return self.by_name.get(filename.lower())
+
+    def find_by_prefix(self, prefix):
+        prefix = prefix.lower()
+        i = bisect_left(self.sorted_names, prefix)
+        if i < len(self.sorted_names) and self.sorted_names[i].startswith(prefix):
+            return self.by_name[self.sorted_names[i]]
+        return None
+
+def find_current_image(profile_id, profile, index, renamed=None):
+    """Find the image currently belonging to a profile using multiple methods"""
+    # Method 0: A rename from an interrupted run that was not yet written to the database
+    if renamed and renamed in index:
+        return index.find_by_name(renamed)
+
+    # Method 1: Check exact match with systemName
+    if profile.get('systemName'):
+        exact_match = index.find_by_stem(profile['systemName'])
+        if exact_match:
+            return exact_match
+
+    # Method 2: Check imagePath if Method 1 failed
+    if profile.get('imagePath'):
+        img_match = index.find_by_name(os.path.basename(profile['imagePath']))
+        if img_match:
+            return img_match
+
+    # Method 3: Look for files matching profile_id if previous methods failed
+    return index.find_by_prefix(profile_id)
+
+def plan_category(category, profiles, files, progress):
+    """Work out every rename, database update and deletion for one category"""
+    index = FileIndex(files)
+    done = set(progress['done'].get(category, []))
+    renamed = progress['renamed'].get(category, {})
+    existing_usernames = {profile.get('systemName', '').lower()
+                          for profile in profiles.values()
+                          if isinstance(profile, dict) and profile.get('systemName')}
+    claimed = set()
+    plan = []
+
+    for profile_id, profile in profiles.items():
+        if profile_id in done:
+            continue
+        if not isinstance(profile, dict) or not profile.get('name'):
+            print(f"⚠️ Skipping profile {profile_id}: No name found")
+            continue
+
+        # Generate consistent username
+        username = generate_username(
+            name=profile['name'],
+            existing_usernames=existing_usernames,
+            existing_username=profile.get('systemName')
+        )
+        new_filename = f"{username}.jpg"
+
+        current_file = find_current_image(profile_id, profile, index, renamed.get(profile_id))
+        if current_file and current_file.lower() in claimed:
+            print(f"⚠️ {current_file} already belongs to another profile")
+            current_file = None
+
+        if not current_file:
+            plan.append({'action': 'delete', 'id': profile_id, 'name': profile['name']})
+            continue
+
+        claimed.add(current_file.lower())
+        step = {
+            'action': 'update',
+            'id': profile_id,
+            'name': profile['name'],
+            'username': username,
+            'from': current_file,
+            'to': new_filename,
+            'templates': [],
+        }
+        if current_file != new_filename:
+            # Extra templates (name@x.jpg) follow their primary image to the new name
+            old_stem = os.path.splitext(current_file)[0]
+            for template in index.templates.get(old_stem.lower(), []):
+                suffix = template[len(old_stem):]
+                step['templates'].append({'from': template, 'to': f"{username}{suffix}"})
+        plan.append(step)
+
+    # Never overwrite an image that is not itself being moved away
+    updates = [step for step in plan if step['action'] == 'update' and step['from'] != step['to']]
+    moving = {move['from'].lower() for step in updates for move in [step] + step['templates']}
+    for step in updates:
+        target = step['to'].lower()
+        if target in index and target != step['from'].lower() and target not in moving:
+            print(f"⚠️ Not renaming {step['from']}: {step['to']} already exists")
+            step['action'] = 'skip'
+            continue
+        for move in list(step['templates']):
+            target = move['to'].lower()
+            if target in index.all_names and target != move['from'].lower() and target not in moving:
+                print(f"⚠️ Not renaming template {move['from']}: {move['to']} already exists")
+                step['templates'].remove(move)
+
+    return plan
+
+def load_progress(resume):
+    if resume and os.path.exists(PROGRESS_FILE):
+        with open(PROGRESS_FILE) as f:
+            progress = json.load(f)
+        print(f"↩️ Resuming from {PROGRESS_FILE}")
+        return progress
+    return {'done': {}, 'renamed': {}, 'staged': {}, 'staging_complete': {}}
+
+def save_progress(progress):
+    tmp_path = f"{PROGRESS_FILE}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(progress, f)
+    os.replace(tmp_path, PROGRESS_FILE)
+
+def recover_staged(category, dir_path, progress):
+    """Finish or undo renames that an interrupted run left under temporary names.
+
+    Once every file had reached its temporary name the renames are completed; before that some
+    targets may still hold files that were not staged yet, so staged files go back to their
+    original names and are planned again.
+    """
+    staged = progress['staged'].get(category, {})
+    renamed = progress['renamed'].setdefault(category, {})
+    complete = progress.setdefault('staging_complete', {}).get(category, True)
+    for profile_id, entry in list(staged.items()):
+        for move in [entry] + entry.get('templates', []):
+            tmp_path = os.path.join(dir_path, move['tmp'])
+            if os.path.exists(tmp_path):
+                target = move['to'] if complete else move['from']
+                os.rename(tmp_path, os.path.join(dir_path, target))
+                print(f"↩️ {'Recovered' if complete else 'Restored'} staged file: {target}")
+        if complete:
+            renamed[profile_id] = entry['to']
+        del staged[profile_id]
+    progress['staging_complete'].pop(category, None)
+    save_progress(progress)
+
+def apply_category(store, category, plan, dir_path, progress, dry_run):
+    """Rename files and push database changes in batched multi-path updates"""
+    done = progress['done'].setdefault(category, [])
+    renamed = progress['renamed'].setdefault(category, {})
+    changes = {}
+    batch_ids = []
+
+    def flush():
+        if not batch_ids:
+            return
+        if not dry_run:
+            store.update_profiles(category, changes)
+            done.extend(batch_ids)
+            for profile_id in batch_ids:
+                renamed.pop(profile_id, None)
+            save_progress(progress)
+        print(f"💾 {'Would write' if dry_run else 'Wrote'} {len(batch_ids)} profiles")
+        changes.clear()
+        batch_ids.clear()
+
+    # Move renamed files to temporary names first so swaps between profiles are safe.
+    # The staging is recorded before any file moves so an interrupted run can recover it.
+    moves = [step for step in plan if step['action'] == 'update' and step['from'] != step['to']]
+    staged = progress['staged'].setdefault(category, {})
+    if dry_run:
+        for step in moves:
+            for move in [step] + step['templates']:
+                print(f"📝 Would rename: {move['from']} → {move['to']}")
+    elif moves:
+        for i, step in enumerate(moves):
+            staged[step['id']] = {
+                'tmp': f".migrating_{i}_{step['to']}", 'from': step['from'], 'to': step['to'],
+                'templates': [{'tmp': f".migrating_{i}_{j}_{move['to']}", 'from': move['from'], 'to': move['to']}
+                              for j, move in enumerate(step['templates'])],
+            }
+        staging_complete = progress.setdefault('staging_complete', {})
+        staging_complete[category] = False
+        save_progress(progress)
+        for step in moves:
+            entry = staged[step['id']]
+            for move in [entry] + entry['templates']:
+                os.rename(os.path.join(dir_path, move['from']), os.path.join(dir_path, move['tmp']))
+        staging_complete[category] = True
+        save_progress(progress)
+
+    for step in plan:
+        try:
+            if step['action'] == 'skip':
+                continue
+
+            if step['action'] == 'delete':
+                print(f"⚠️ No image found for {step['name']}, {'would remove' if dry_run else 'removing'} from database")
+                # Remove the profile from database if no image is found
+                changes[step['id']] = None
+            else:
+                if step['id'] in staged:
+                    entry = staged[step['id']]
+                    os.rename(os.path.join(dir_path, entry['tmp']), os.path.join(dir_path, step['to']))
+                    for staged_move in entry['templates']:
+                        os.rename(os.path.join(dir_path, staged_move['tmp']), os.path.join(dir_path, staged_move['to']))
+                    renamed[step['id']] = step['to']
+                    del staged[step['id']]
+                    print(f"✅ Renamed: {step['from']} → {step['to']}")
+
+                # Update database entry
+                changes[step['id']] = {
+                    'systemName': step['username'],
+                    'imagePath': f"/faces/{category}/{step['to']}",
+                    'lastUpdated': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                }
+
+            batch_ids.append(step['id'])
+            if len(batch_ids) >= UPDATE_BATCH_SIZE:
+                flush()
+
+        except Exception as e:
+            print(f"❌ Error processing {step['name']}: {str(e)}")
+
+    flush()
+
+def migrate_image_names(store, dry_run=False, resume=True):
     """Migrate image names to use consistent username-based naming."""
-    categories = ['staff', 'customers']
-    base_path = 'faces'
+    progress = load_progress(resume)
 
-    for category in categories:
+    for category in CATEGORIES:
         print(f"\nProcessing {category}...")
-        profiles_ref = db.reference(f'/{category}')
-        profiles = profiles_ref.get() or {}
+        profiles = store.get_profiles(category)
 
-        dir_path = os.path.join(base_path, category)
+        dir_path = os.path.join(BASE_PATH, category)
         if not os.path.exists(dir_path):
-            os.makedirs(dir_path)
-            print(f"✅ Created directory: {dir_path}")
+            if dry_run:
+                print(f"📝 Would create directory: {dir_path}")
+            else:
+                os.makedirs(dir_path)
+                print(f"✅ Created directory: {dir_path}")
+
+        if not dry_run and progress['staged'].get(category):
+            recover_staged(category, dir_path, progress)
 
         # Get all image files in the directory (case-insensitive)
-        files = [f for f in os.listdir(dir_path) if f.lower().endswith(('.jpg', '.jpeg', '.png'))]
-
-        for profile_id, profile in profiles.items():
-            try:
-                if not profile.get('name'):
-                    print(f"⚠️ Skipping profile {profile_id}: No name found")
-                    continue
-
-                # Generate consistent username
-                username = generate_username(
-                    name=profile['name'],
-                    category=category,
-                    existing_username=profile.get('systemName')
-                )
-
-                new_filename = f"{username}.jpg"
-                current_image_path = None
-
-                # Try to find the current image path using multiple methods
-                current_image_path = None
-                
-                # Method 1: Check exact match with systemName
-                if profile.get('systemName'):
-                    exact_match = next((f for f in files if os.path.splitext(f)[0].lower() == profile['systemName'].lower()), None)
-                    if exact_match:
-                        current_image_path = os.path.join(dir_path, exact_match)
-                
-                # Method 2: Check imagePath if Method 1 failed
-                if not current_image_path and profile.get('imagePath'):
-                    img_filename = os.path.basename(profile['imagePath'])
-                    img_match = next((f for f in files if f.lower() == img_filename.lower()), None)
-                    if img_match:
-                        current_image_path = os.path.join(dir_path, img_match)
-                
-                # Method 3: Look for files matching profile_id if previous methods failed
-                if not current_image_path:
-                    matching_files = [f for f in files if f.lower().startswith(profile_id.lower())]
-                    if matching_files:
-                        current_image_path = os.path.join(dir_path, matching_files[0])
-
-                if current_image_path and os.path.exists(current_image_path):
-                    new_image_path = os.path.join(dir_path, new_filename)
-
-                    # Rename the file if it exists and needs to be renamed
-                    if current_image_path != new_image_path:
-                        os.rename(current_image_path, new_image_path)
-                        print(f"✅ Renamed: {os.path.basename(current_image_path)} → {new_filename}")
-
-                    # Update database entry
-                    updates = {
-                        'systemName': username,
-                        'imagePath': f'/faces/{category}/{new_filename}',
-                        'lastUpdated': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                    }
-                    profiles_ref.child(profile_id).update(updates)
-                    print(f"✅ Updated database for {profile['name']} ({username})")
-                else:
-                    print(f"⚠️ No image found for {profile['name']}, removing from database...")
-                    # Remove the profile from database if no image is found
-                    profiles_ref.child(profile_id).delete()
-                    print(f"✅ Removed {profile['name']} from database")
-
-            except Exception as e:
-                print(f"❌ Error processing {profile.get('name', profile_id)}: {str(e)}")
-
-    print('\n✨ Migration completed!')
+        files = []
+        if os.path.exists(dir_path):
+            files = [f for f in os.listdir(dir_path)
+                     if f.lower().endswith(('.jpg', '.jpeg', '.png')) and not f.startswith('.')]
+
+        plan = plan_category(category, profiles, files, progress)
+        counts = {action: sum(1 for step in plan if step['action'] == action) for action in ('update', 'delete', 'skip')}
+        renames = sum(1 for step in plan if step['action'] == 'update' and step['from'] != step['to'])
+        print(f"📋 {counts['update']} updates ({renames} renames), {counts['delete']} deletions, {counts['skip']} skipped")
+
+        apply_category(store, category, plan, dir_path, progress, dry_run)
+
+    if not dry_run and any(progress['staged'].values()):
+        # A failed rename left files under temporary names; the next run puts them in place
+        print(f"⚠️ Some renames failed, rerun to finish them (progress kept in {PROGRESS_FILE})")
+        return
+    if not dry_run and os.path.exists(PROGRESS_FILE):
+        os.remove(PROGRESS_FILE)
+    print('\n✨ Migration completed!' if not dry_run else '\n✨ Dry run completed, nothing was changed')
 
 if __name__ == '__main__':
-    migrate_image_names()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Rename face images to username-based file names')
+    parser.add_argument('--dry-run', action='store_true', help='print the planned changes without applying them')
+    parser.add_argument('--restart', action='store_true', help=f'ignore {PROGRESS_FILE} from an interrupted run')
+    parser.add_argument('--datastore', choices=['firebase', 'local'], help='datastore to migrate (defaults to config)')
+    args = parser.parse_args()
+
+    migrate_image_names(create_store(args.datastore), dry_run=args.dry_run, resume=not args.restart)
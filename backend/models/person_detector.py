@@ -0,0 +1,158 @@
+"""Person detectors for YOLOTracker.
+
+`torch` runs yolov8n.pt through ultralytics (GPU when available). `onnx` runs the same network
+exported to ONNX with a fixed input shape on the CPU, through ONNX Runtime when it is installed
+(required for int8 models) or OpenCV DNN otherwise, without importing torch. Export once with
+
+    python -m models.person_detector export            # models/yolov8n.onnx
+    python -m models.person_detector export --int8     # also models/yolov8n-int8.onnx
+"""
+import argparse
+import os
+
+import cv2
+import numpy as np
+
+import config
+
+PERSON_CLASS = 0
+CONFIDENCE_THRESHOLD = 0.5
+NMS_THRESHOLD = 0.45
+
+
+class TorchPersonDetector:
+    name = 'torch'
+
+    def __init__(self, model_path='yolov8n.pt'):
+        from ultralytics import YOLO
+        import torch
+        self.model = YOLO(model_path)
+        self.device = 0 if torch.cuda.is_available() else 'cpu'
+
+    def detect(self, frame):
+        """(boxes as N x 4 left, top, right, bottom, confidences) of people in a BGR frame"""
+        results = self.model(frame, classes=[PERSON_CLASS], device=self.device, verbose=False)
+        boxes, confidences = [], []
+        for result in results:
+            boxes.append(result.boxes.xyxy.cpu().numpy())
+            confidences.append(result.boxes.conf.cpu().numpy())
+        boxes = np.concatenate(boxes) if boxes else np.empty((0, 4), dtype=np.float32)
+        confidences = np.concatenate(confidences) if confidences else np.empty(0, dtype=np.float32)
+        keep = confidences > CONFIDENCE_THRESHOLD
+        return boxes[keep], confidences[keep]
+
+
+class OnnxPersonDetector:
+    name = 'onnx'
+
+    def __init__(self, model_path=None, input_size=None, threads=None, runtime=None):
+        self.model_path = model_path or config.YOLO_ONNX_PATH
+        self.input_size = input_size or config.YOLO_INPUT_SIZE
+        threads = config.YOLO_THREADS if threads is None else threads
+        runtime = runtime or config.YOLO_RUNTIME
+        if not os.path.exists(self.model_path):
+            raise FileNotFoundError(f"{self.model_path} not found; run python -m models.person_detector export")
+
+        if runtime == 'auto':
+            try:
+                import onnxruntime  # noqa: F401
+                runtime = 'onnxruntime'
+            except ImportError:
+                runtime = 'opencv'
+        self.runtime = runtime
+
+        # Reused for every frame: the letterboxed input never changes shape
+        self._canvas = np.full((self.input_size, self.input_size, 3), 114, dtype=np.uint8)
+        if runtime == 'onnxruntime':
+            import onnxruntime
+            options = onnxruntime.SessionOptions()
+            if threads:
+                options.intra_op_num_threads = threads
+                options.inter_op_num_threads = 1
+            options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+            self.session = onnxruntime.InferenceSession(self.model_path, options,
+                                                        providers=['CPUExecutionProvider'])
+            self.input_name = self.session.get_inputs()[0].name
+        else:
+            if threads:
+                cv2.setNumThreads(threads)
+            self.net = cv2.dnn.readNetFromONNX(self.model_path)
+            self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+            self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+
+    def _letterbox(self, frame):
+        height, width = frame.shape[:2]
+        scale = min(self.input_size / width, self.input_size / height)
+        new_width, new_height = int(round(width * scale)), int(round(height * scale))
+        pad_x, pad_y = (self.input_size - new_width) // 2, (self.input_size - new_height) // 2
+        self._canvas[:] = 114
+        self._canvas[pad_y:pad_y + new_height, pad_x:pad_x + new_width] = cv2.resize(frame, (new_width, new_height))
+        return scale, pad_x, pad_y
+
+    def detect(self, frame):
+        """(boxes as N x 4 left, top, right, bottom, confidences) of people in a BGR frame"""
+        scale, pad_x, pad_y = self._letterbox(frame)
+        blob = cv2.dnn.blobFromImage(self._canvas, 1 / 255.0, swapRB=True)
+        if self.runtime == 'onnxruntime':
+            output = self.session.run(None, {self.input_name: blob})[0]
+        else:
+            self.net.setInput(blob)
+            output = self.net.forward()
+
+        # yolov8 output is 1 x (4 + classes) x anchors: cx, cy, w, h, then class scores
+        predictions = output[0].T
+        scores = predictions[:, 4 + PERSON_CLASS]
+        candidates = predictions[scores > CONFIDENCE_THRESHOLD]
+        scores = scores[scores > CONFIDENCE_THRESHOLD]
+        if not len(candidates):
+            return np.empty((0, 4), dtype=np.float32), np.empty(0, dtype=np.float32)
+
+        cx, cy, w, h = candidates[:, 0], candidates[:, 1], candidates[:, 2], candidates[:, 3]
+        boxes = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+        boxes -= (pad_x, pad_y, pad_x, pad_y)
+        boxes /= scale
+
+        ltwh = np.column_stack([boxes[:, :2], boxes[:, 2:] - boxes[:, :2]])
+        keep = cv2.dnn.NMSBoxes(ltwh.tolist(), scores.tolist(), CONFIDENCE_THRESHOLD, NMS_THRESHOLD)
+        keep = np.array(keep, dtype=np.int64).reshape(-1)
+        return boxes[keep].astype(np.float32), scores[keep].astype(np.float32)
+
+
+def create_person_detector(backend=None):
+    """Detector selected by config.TRACKER_BACKEND; 'auto' prefers an exported ONNX model"""
+    backend = backend or config.TRACKER_BACKEND
+    if backend == 'auto':
+        backend = 'onnx' if os.path.exists(config.YOLO_ONNX_PATH) else 'torch'
+    if backend == 'onnx':
+        return OnnxPersonDetector()
+    if backend == 'torch':
+        return TorchPersonDetector()
+    raise ValueError(f"Unknown tracker backend: {backend}")
+
+
+def export(int8=False, input_size=None):
+    """Export yolov8n.pt to a fixed-shape ONNX model, optionally with an int8 copy"""
+    from ultralytics import YOLO
+
+    input_size = input_size or config.YOLO_INPUT_SIZE
+    exported = YOLO('yolov8n.pt').export(format='onnx', imgsz=input_size, dynamic=False,
+                                         simplify=True, opset=12)
+    onnx_path = os.path.join(config.MODELS_DIR, 'yolov8n.onnx')
+    os.replace(exported, onnx_path)
+    print(f"✅ Exported {onnx_path} ({input_size}x{input_size})")
+
+    if int8:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        int8_path = os.path.join(config.MODELS_DIR, 'yolov8n-int8.onnx')
+        quantize_dynamic(onnx_path, int8_path, weight_type=QuantType.QUInt8)
+        print(f"✅ Quantized {int8_path}; use it with NOVA_YOLO_ONNX_PATH and the onnxruntime runtime")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export the YOLO person detector for CPU inference')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    export_parser = subparsers.add_parser('export')
+    export_parser.add_argument('--int8', action='store_true', help='also write a dynamically quantized int8 model')
+    export_parser.add_argument('--input-size', type=int, help='fixed square input size (default NOVA_YOLO_INPUT_SIZE)')
+    args = parser.parse_args()
+    export(int8=args.int8, input_size=args.input_size)
@@ -1,16 +1,38 @@
 import cv2
 import numpy as np
-from ultralytics import YOLO
-from deep_sort_realtime.deepsort_tracker import DeepSort
 from collections import defaultdict
 import time
 
+def appearance_embedding(frame, box):
+    """Normalized HSV colour histogram of a person crop, a torch-free DeepSORT appearance feature"""
+    left, top, right, bottom = (int(v) for v in box)
+    height, width = frame.shape[:2]
+    crop = frame[max(top, 0):min(bottom, height), max(left, 0):min(right, width)]
+    if crop.size == 0:
+        return np.full(128, 1 / np.sqrt(128), dtype=np.float32)
+    hsv = cv2.cvtColor(crop, cv2.COLOR_BGR2HSV)
+    hist = cv2.calcHist([hsv], [0, 1], None, [16, 8], [0, 180, 0, 256]).reshape(-1)
+    norm = np.linalg.norm(hist)
+    return hist / norm if norm else hist
+
 class YOLOTracker:
-    def __init__(self):
-        # Initialize YOLO model
-        self.yolo_model = YOLO('yolov8n.pt')
-        
-        # Initialize DeepSORT tracker
+    def __init__(self, detector=None):
+        # torch/ultralytics take seconds to import, so only pay for them when a tracker is built,
+        # and not at all with the ONNX detector
+        from deep_sort_realtime.deepsort_tracker import DeepSort
+        from models.person_detector import create_person_detector
+        
+        # Initialize the person detector selected by config.TRACKER_BACKEND
+        self.detector = detector if detector is not None else create_person_detector()
+        
+        # Initialize DeepSORT tracker; the mobilenet embedder needs torch, so the ONNX path
+        # supplies colour histogram embeddings instead
+        if self.detector.name == 'torch':
+            import torch
+            gpu = torch.cuda.is_available()
+            embedder_options = {'embedder': 'mobilenet', 'half': gpu, 'embedder_gpu': gpu}
+        else:
+            embedder_options = {'embedder': None}
         self.tracker = DeepSort(
             max_age=30,
             n_init=3,
@@ -18,10 +40,8 @@ class YOLOTracker:
             max_cosine_distance=0.3,
             nn_budget=None,
             override_track_class=None,
-            embedder="mobilenet",
-            half=True,
             bgr=True,
-            embedder_gpu=True
+            **embedder_options
         )
         
         # Store tracking data
@@ -42,6 +62,7 @@ class YOLOTracker:
         self.target_width = 640  # Target width for processing
         self.last_detection_time = 0
         self.detection_interval = 0.1  # Minimum time between detections (seconds)
+        self.last_results = {'num_people': 0, 'group_greeting_needed': False, 'tracked_people': {}}
         
     def preprocess_frame(self, frame):
         """Preprocess frame for detection"""
@@ -69,21 +90,21 @@ class YOLOTracker:
         # Preprocess frame
         processed_frame = self.preprocess_frame(frame)
         
-        # Run YOLO detection
-        results = self.yolo_model(processed_frame, classes=[0])  # Only detect people (class 0)
+        # Run person detection (boxes are left, top, right, bottom)
+        boxes, confidences = self.detector.detect(processed_frame)
         
-        # Extract detections
+        # DeepSORT expects ([left, top, width, height], confidence, class)
         detections = []
-        for result in results:
-            boxes = result.boxes.xyxy.cpu().numpy()
-            confidences = result.boxes.conf.cpu().numpy()
-            
-            for box, conf in zip(boxes, confidences):
-                if conf > 0.5:  # Only keep detections with confidence > 0.5
-                    detections.append((box, conf, 'person'))
+        for box, conf in zip(boxes, confidences):
+            left, top, right, bottom = (float(v) for v in box)
+            detections.append(([left, top, right - left, bottom - top], float(conf), 'person'))
         
         # Update tracker
-        tracks = self.tracker.update_tracks(detections, frame=processed_frame)
+        if self.detector.name == 'torch':
+            tracks = self.tracker.update_tracks(detections, frame=processed_frame)
+        else:
+            embeds = [appearance_embedding(processed_frame, box) for box in boxes]
+            tracks = self.tracker.update_tracks(detections, embeds=embeds)
         
         # Process tracking results
         active_tracks = {}
@@ -0,0 +1,253 @@
+"""MJPEG preview tiers shared between clients.
+
+A PreviewEncoder turns one camera's frame ring into JPEGs at one (width, quality, fps) setting on
+its own thread; every client watching the same camera at the same setting gets the same bytes,
+so N lobby screens cost one encode. Frames that have not visibly changed since the last encode
+(and carry the same detection boxes) are skipped instead of re-encoded and re-sent.
+
+Each client measures how long the server takes to write a frame to it; a client that cannot
+drain the stream at the tier's frame rate steps down to a lower-quality encoder of the same tier
+and steps back up once it keeps up again.
+"""
+import logging
+import threading
+import time
+
+import cv2
+import numpy as np
+
+import config
+import metrics
+from frame_ring import FrameRing
+from metrics import stage
+
+logger = logging.getLogger('nova')
+
+QUALITY_STEPS = (0, 15, 30)  # quality reductions a slow client can step down through
+MIN_QUALITY = 30
+CHANGE_THRESHOLD = 2.0  # mean absolute difference (0-255) of a 32x18 grey thumbnail
+KEYFRAME_INTERVAL = 5.0  # re-encode an unchanged scene this often so viewers can see the feed is live
+IDLE_TIMEOUT = 5.0  # seconds an encoder without clients stays alive
+STALE_RING_TIMEOUT = 5.0  # re-attach a remote ring that has not advanced in this long
+
+PREVIEW_FRAMES_TOTAL = metrics.REGISTRY.counter(
+    'nova_preview_frames_total', 'Preview frames by outcome (encoded, unchanged)', ['result'])
+PREVIEW_BYTES_TOTAL = metrics.REGISTRY.counter(
+    'nova_preview_bytes_total', 'JPEG bytes written to preview clients')
+
+
+def tier_settings(args):
+    """(width, quality, fps) from a named tier plus optional width/quality/fps overrides"""
+    tier = dict(config.PREVIEW_TIERS.get(args.get('tier', config.PREVIEW_DEFAULT_TIER),
+                                         config.PREVIEW_TIERS[config.PREVIEW_DEFAULT_TIER]))
+    for key in ('width', 'quality', 'fps'):
+        if args.get(key):
+            tier[key] = int(args[key])
+    # Snap to coarse steps so clients asking for nearly the same thing share one encoder
+    width = 0 if tier['width'] <= 0 else max(160, min(tier['width'], config.FRAME_MAX_WIDTH)) // 32 * 32
+    quality = max(MIN_QUALITY, min(tier['quality'], 95)) // 5 * 5
+    fps = max(1, min(tier['fps'], 30))
+    return width, quality, fps
+
+
+def frame_signature(image):
+    thumb = cv2.resize(image, (32, 18), interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(thumb, cv2.COLOR_BGR2GRAY).astype(np.int16)
+
+
+def box_signature(detections, width, height):
+    """Detection boxes in output pixels, so sub-pixel jitter doesn't count as a change"""
+    boxes = []
+    for detection in detections:
+        if 'location' in detection:
+            location = detection['location']
+            boxes.append((int(location['top'] * height / 100), int(location['right'] * width / 100),
+                          int(location['bottom'] * height / 100), int(location['left'] * width / 100)))
+    return tuple(boxes)
+
+
+class PreviewEncoder:
+    """Encodes the newest frame of one camera at one setting for all of its clients"""
+
+    def __init__(self, hub, key, ring, detections, width, quality, fps):
+        self.hub = hub
+        self.key = key
+        self.ring = ring
+        self.detections = detections
+        self.width = width
+        self.quality = quality
+        self.interval = 1.0 / fps
+        self.jpeg = None
+        self.version = 0
+        self.clients = 0
+        self.closed = False
+        self.idle_since = time.monotonic()
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name=f'preview-{key[0]}-{width}q{quality}', daemon=True)
+        self._thread.start()
+
+    def wait(self, after_version, timeout=1.0):
+        """Block until an encode newer than after_version exists; returns (version, jpeg)"""
+        with self._cond:
+            self._cond.wait_for(lambda: self.closed or self.version > after_version, timeout)
+            return self.version, self.jpeg
+
+    def _run(self):
+        canvas = None
+        last_seq = 0
+        last_signature = None
+        last_boxes = None
+        last_sent = 0.0
+        last_frame_at = time.monotonic()
+        while True:
+            if self.hub.retire_if_idle(self):
+                return
+
+            started = time.monotonic()
+            try:
+                frame = self.ring.wait_next(last_seq, timeout=1.0)
+                closed = self.ring.closed
+            except Exception as e:
+                logger.warning(f"⚠️ Preview ring {self.ring.name} failed, closing: {str(e)}")
+                closed = True
+            if closed:
+                # The camera was stopped; end the streams of every client on this encoder
+                self.hub.discard(self)
+                with self._cond:
+                    self.closed = True
+                    self._cond.notify_all()
+                return
+            if frame is None:
+                if not self.ring.owner and time.monotonic() - last_frame_at > STALE_RING_TIMEOUT:
+                    self._reattach()
+                    last_seq = 0
+                    last_frame_at = time.monotonic()
+                continue
+            last_seq = frame.seq
+            last_frame_at = time.monotonic()
+
+            try:
+                height, width = frame.image.shape[:2]
+                if self.width and self.width < width:
+                    size = (self.width, int(height * self.width / width) // 2 * 2)
+                else:
+                    size = (width, height)
+                if canvas is None or canvas.shape[:2] != (size[1], size[0]):
+                    canvas = np.empty((size[1], size[0], 3), dtype=np.uint8)
+                with stage('preview_resize'):
+                    if size == (width, height):
+                        np.copyto(canvas, frame.image)
+                    else:
+                        cv2.resize(frame.image, size, dst=canvas, interpolation=cv2.INTER_AREA)
+                if not frame.valid():
+                    continue
+
+                boxes = box_signature(self.detections(), size[0], size[1])
+                signature = frame_signature(canvas)
+                unchanged = (last_signature is not None and boxes == last_boxes
+                             and float(np.mean(np.abs(signature - last_signature))) < CHANGE_THRESHOLD)
+                if unchanged and time.monotonic() - last_sent < KEYFRAME_INTERVAL:
+                    PREVIEW_FRAMES_TOTAL.inc(result='unchanged')
+                else:
+                    for top, right, bottom, left in boxes:
+                        cv2.rectangle(canvas, (left, top), (right, bottom), (0, 255, 0), 2)
+                    with stage('jpeg_encode'):
+                        ret, buffer = cv2.imencode('.jpg', canvas, [int(cv2.IMWRITE_JPEG_QUALITY), self.quality])
+                    if ret:
+                        jpeg = buffer.tobytes()
+                        with self._cond:
+                            self.jpeg = jpeg
+                            self.version += 1
+                            self._cond.notify_all()
+                        last_signature, last_boxes, last_sent = signature, boxes, time.monotonic()
+                        PREVIEW_FRAMES_TOTAL.inc(result='encoded')
+            except Exception as e:
+                logger.error(f"Error encoding preview: {str(e)}")
+
+            delay = self.interval - (time.monotonic() - started)
+            if delay > 0:
+                time.sleep(delay)
+
+    def _reattach(self):
+        try:
+            ring = FrameRing.attach(self.ring.name)
+        except FileNotFoundError:
+            return
+        old, self.ring = self.ring, ring
+        old.close()
+
+
+class PreviewHub:
+    """Creates, shares and retires PreviewEncoders"""
+
+    def __init__(self):
+        self._encoders = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, camera_id, ring_factory, detections, width, quality, fps):
+        key = (camera_id, width, quality, fps)
+        with self._lock:
+            encoder = self._encoders.get(key)
+            if encoder is None:
+                encoder = PreviewEncoder(self, key, ring_factory(), detections, width, quality, fps)
+                self._encoders[key] = encoder
+            encoder.clients += 1
+            return encoder
+
+    def release(self, encoder):
+        with self._lock:
+            encoder.clients -= 1
+            if encoder.clients == 0:
+                encoder.idle_since = time.monotonic()
+
+    def discard(self, encoder):
+        with self._lock:
+            if self._encoders.get(encoder.key) is encoder:
+                del self._encoders[encoder.key]
+
+    def retire_if_idle(self, encoder):
+        with self._lock:
+            if encoder.clients > 0 or time.monotonic() - encoder.idle_since < IDLE_TIMEOUT:
+                return False
+            del self._encoders[encoder.key]
+        if not encoder.ring.owner:
+            encoder.ring.close()
+        return True
+
+    def stream(self, camera_id, ring_factory, detections, width, quality, fps):
+        """MJPEG generator for one client that steps quality down while it cannot keep up"""
+        interval = 1.0 / fps
+        step = 0
+        drain = 0.0  # moving average of seconds spent writing a frame to this client
+        fast_frames = 0
+        encoder = self.acquire(camera_id, ring_factory, detections, width, quality, fps)
+        version = 0
+        try:
+            while True:
+                new_version, jpeg = encoder.wait(version)
+                if encoder.closed:
+                    return
+                if new_version == version or jpeg is None:
+                    continue
+                version = new_version
+
+                started = time.monotonic()
+                yield (b'--frame\r\n'
+                       b'Content-Type: image/jpeg\r\n\r\n' + jpeg + b'\r\n')
+                drain = 0.8 * drain + 0.2 * (time.monotonic() - started)
+                PREVIEW_BYTES_TOTAL.inc(len(jpeg))
+
+                fast_frames = fast_frames + 1 if drain < 0.3 * interval else 0
+                new_step = step
+                if drain > 0.8 * interval and step < len(QUALITY_STEPS) - 1:
+                    new_step = step + 1
+                elif fast_frames > 5 * fps and step > 0:
+                    new_step = step - 1
+                if new_step != step:
+                    step, fast_frames, drain = new_step, 0, 0.0
+                    self.release(encoder)
+                    encoder = self.acquire(camera_id, ring_factory, detections, width,
+                                           max(MIN_QUALITY, quality - QUALITY_STEPS[step]), fps)
+                    version = 0
+        finally:
+            self.release(encoder)
@@ -0,0 +1,337 @@
+"""Record camera sessions and replay them through the full pipeline for soak tests.
+
+    python replay.py record --source rtsp://camera/stream --output lobby.nvr --duration 600
+    python replay.py soak --recording lobby.nvr --duration 7200 --output soak.json
+    python replay.py soak --recording lobby.nvr --speed 0 --duration 600   # as fast as possible
+
+A recording is a sequence of JPEG frames with their capture timestamps:
+the 8-byte magic NOVAREC1, then per frame a little-endian float64 timestamp, a uint32 length
+and the JPEG bytes. Any component that opens cameras through capture.open_source() also
+accepts replay:///path/to/file.nvr?speed=1&loop=1 as a camera URL.
+
+The soak runner feeds a recording through the capture ring and process_frame against a local
+SQLite datastore in a scratch directory, and reports end-to-end latency, dropped frames,
+memory growth and the volume of datastore and disk writes.
+"""
+import argparse
+import json
+import os
+import shutil
+import struct
+import tempfile
+import threading
+import time
+import urllib.parse
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+import config
+from gallery import CATEGORIES
+from measurement import git_revision, peak_rss_mb, rss_mb, summarize
+
+MAGIC = b'NOVAREC1'
+FRAME_HEADER = struct.Struct('<dI')
+WRITE_METHODS = ('update_profiles', 'update_profile', 'add_visit', 'set_last_unknown_greeting',
+                 'set_current_detections')
+
+
+class RecordingWriter:
+    def __init__(self, path, quality=90):
+        self._file = open(path, 'wb')
+        self._file.write(MAGIC)
+        self.quality = quality
+        self.frames = 0
+
+    def write(self, frame, timestamp=None):
+        ret, buffer = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), self.quality])
+        if not ret:
+            return
+        data = buffer.tobytes()
+        self._file.write(FRAME_HEADER.pack(time.time() if timestamp is None else timestamp, len(data)))
+        self._file.write(data)
+        self.frames += 1
+
+    def close(self):
+        self._file.close()
+
+
+def read_recording(path):
+    """Yield (timestamp, jpeg bytes) for every complete frame of a recording"""
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a Nova recording")
+        while True:
+            header = f.read(FRAME_HEADER.size)
+            if len(header) < FRAME_HEADER.size:
+                return
+            timestamp, length = FRAME_HEADER.unpack(header)
+            data = f.read(length)
+            if len(data) < length:
+                return  # truncated by an interrupted recording
+            yield timestamp, data
+
+
+class ReplaySource:
+    """cv2.VideoCapture look-alike playing a recording at `speed` x real time (0 = no pacing)"""
+
+    def __init__(self, path, speed=1.0, loop=False):
+        self.path = path
+        self.speed = speed
+        self.loop = loop
+        self.loops = 0
+        self._frames = read_recording(path)
+        self._opened = True
+        self._first_timestamp = None
+        self._started = None
+
+    @classmethod
+    def from_url(cls, url):
+        """replay:///path/to/file.nvr?speed=1&loop=1"""
+        parsed = urllib.parse.urlparse(url)
+        query = urllib.parse.parse_qs(parsed.query)
+        return cls(parsed.path, speed=float(query.get('speed', ['1'])[0]),
+                   loop=query.get('loop', ['0'])[0] == '1')
+
+    def isOpened(self):
+        return self._opened and os.path.exists(self.path)
+
+    def set(self, prop, value):
+        return False
+
+    def release(self):
+        self._opened = False
+
+    def read(self, image=None):
+        if not self._opened:
+            return False, None
+        try:
+            timestamp, data = next(self._frames)
+        except StopIteration:
+            if not self.loop:
+                return False, None
+            self.loops += 1
+            self._frames = read_recording(self.path)
+            self._first_timestamp = None
+            return self.read(image)
+
+        if self.speed > 0:
+            # Keep the recorded spacing between frames, scaled by speed
+            if self._first_timestamp is None:
+                self._first_timestamp, self._started = timestamp, time.monotonic()
+            due = self._started + (timestamp - self._first_timestamp) / self.speed
+            delay = due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+        frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is not None and image.shape == frame.shape:
+            np.copyto(image, frame)
+            return True, image
+        return True, frame
+
+
+def record(source, output, duration, quality):
+    cap = cv2.VideoCapture(source)
+    if not cap.isOpened():
+        raise SystemExit(f"❌ Failed to open {source}")
+    writer = RecordingWriter(output, quality)
+    deadline = time.monotonic() + duration
+    try:
+        while time.monotonic() < deadline:
+            success, frame = cap.read()
+            if not success:
+                time.sleep(0.05)
+                continue
+            writer.write(frame)
+            if writer.frames % 100 == 0:
+                print(f"🎥 {writer.frames} frames, {os.path.getsize(output) / 1e6:.1f} MB")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        writer.close()
+        cap.release()
+    print(f"✅ Recorded {writer.frames} frames to {output} ({os.path.getsize(output) / 1e6:.1f} MB)")
+
+
+class CountingStore:
+    """Datastore wrapper counting write calls and their JSON payload size"""
+
+    def __init__(self, store):
+        self._store = store
+        self._lock = threading.Lock()
+        self.writes = {}
+
+    def __getattr__(self, name):
+        attr = getattr(self._store, name)
+        if name not in WRITE_METHODS:
+            return attr
+
+        def counted(*args, **kwargs):
+            size = len(json.dumps([args, kwargs], default=str))
+            with self._lock:
+                calls, total = self.writes.get(name, (0, 0))
+                self.writes[name] = (calls + 1, total + size)
+            return attr(*args, **kwargs)
+        return counted
+
+    def reset(self):
+        with self._lock:
+            self.writes = {}
+
+    def summary(self):
+        with self._lock:
+            return {name: {'calls': calls, 'bytes': size} for name, (calls, size) in self.writes.items()}
+
+
+def directory_bytes(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for file in files:
+            try:
+                total += os.path.getsize(os.path.join(root, file))
+            except OSError:
+                pass
+    return total
+
+
+def memory_growth_mb_per_hour(samples):
+    """Slope of a least-squares line through (seconds, rss MB) samples"""
+    if len(samples) < 2:
+        return None
+    seconds, rss = np.array(samples).T
+    if seconds[-1] == seconds[0]:
+        return None
+    return round(float(np.polyfit(seconds, rss, 1)[0] * 3600), 2)
+
+
+def soak(args):
+    import main
+    from capture import CameraCapture
+    from storage import SQLiteStore
+    from visit_log import VisitLog
+
+    workdir = tempfile.mkdtemp(prefix='nova-soak-')
+    try:
+        # Share the real gallery images, keep everything the pipeline writes in the scratch dir
+        faces_dir = os.path.join(workdir, 'faces')
+        os.makedirs(faces_dir)
+        for category in CATEGORIES:
+            source = os.path.join(args.faces_dir, category)
+            if os.path.isdir(source):
+                os.symlink(source, os.path.join(faces_dir, category))
+            else:
+                os.makedirs(os.path.join(faces_dir, category))
+        visits_dir = os.path.join(workdir, 'visits')
+
+        store = CountingStore(SQLiteStore(os.path.join(workdir, 'soak.db')))
+        # The category directories are symlinks to the real gallery, so never harvest into them
+        system = main.FaceRecognitionSystem(store=store, visit_log=VisitLog(visits_dir), faces_dir=faces_dir,
+                                            watch_files=False, auto_harvest=False)
+        system.warm_up()
+        store.reset()
+
+        url = f"replay://{os.path.abspath(args.recording)}?speed={args.speed}&loop=1"
+        capture = CameraCapture('soak', url)
+        latencies = []
+        processed = 0
+        torn = 0
+        faces = 0
+        memory = [(0.0, rss_mb())]
+        started = time.monotonic()
+        last_report = started
+        last_seq = 0
+        print(f"🧪 Soaking {args.recording} for {args.duration}s at speed {args.speed or 'max'}")
+        try:
+            while time.monotonic() - started < args.duration:
+                frame = capture.ring.wait_next(last_seq)
+                if frame is None:
+                    if not capture.running:
+                        break
+                    continue
+                last_seq = frame.seq
+                detections = system.process_frame(frame.image, skip_alternate=False, source='soak',
+                                                  frame_valid=frame.valid)
+                if detections is None:
+                    # Overwritten by the capture thread while it was being read
+                    torn += 1
+                    continue
+                # Latency from the frame landing in the ring to its detections being ready
+                latencies.append(time.time() - frame.timestamp)
+                processed += 1
+                faces += len(detections)
+
+                now = time.monotonic()
+                if now - last_report >= args.report_interval:
+                    last_report = now
+                    memory.append((now - started, rss_mb()))
+                    recent = summarize(latencies[-1000:])
+                    print(f"  {now - started:>7.0f}s  {processed} frames  dropped "
+                          f"{1 - processed / max(capture.ring.latest_seq, 1):.1%}  torn {torn}  p50 {recent['p50_ms']} ms  "
+                          f"rss {memory[-1][1]:.1f} MB")
+        except KeyboardInterrupt:
+            print("⏹️ Interrupted, reporting what ran")
+        finally:
+            elapsed = time.monotonic() - started
+            captured = capture.ring.latest_seq
+            loops = capture.cap.loops
+            capture.stop()
+            system.visit_log.close()
+        memory.append((elapsed, rss_mb()))
+
+        return {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'revision': git_revision(),
+            'recording': os.path.abspath(args.recording),
+            'speed': args.speed,
+            'duration_seconds': round(elapsed, 1),
+            'recording_loops': loops,
+            'frames_captured': captured,
+            'frames_processed': processed,
+            'drop_rate': round(1 - processed / captured, 4) if captured else None,
+            'frames_torn': torn,
+            'torn_rate': round(torn / (processed + torn), 4) if processed + torn else None,
+            'processed_fps': round(processed / elapsed, 2) if elapsed else None,
+            'faces': faces,
+            'latency': summarize(latencies) if latencies else None,
+            'rss_mb': {'start': round(memory[0][1], 1), 'end': round(memory[-1][1], 1),
+                       'peak': round(peak_rss_mb(), 1), 'growth_mb_per_hour': memory_growth_mb_per_hour(memory)},
+            'writes': {
+                'datastore': store.summary(),
+                'visit_log_bytes': directory_bytes(visits_dir),
+                'extracted_faces_bytes': directory_bytes(os.path.join(faces_dir, 'extracted_faces')),
+            },
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Record camera sessions and replay them for soak tests')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    record_parser = subparsers.add_parser('record', help='capture a camera session to a recording file')
+    record_parser.add_argument('--source', required=True, help='camera URL or device index')
+    record_parser.add_argument('--output', required=True)
+    record_parser.add_argument('--duration', type=float, default=300, help='seconds to record')
+    record_parser.add_argument('--quality', type=int, default=90, help='JPEG quality of stored frames')
+
+    soak_parser = subparsers.add_parser('soak', help='replay a recording through the full pipeline')
+    soak_parser.add_argument('--recording', required=True)
+    soak_parser.add_argument('--duration', type=float, default=3600, help='seconds to run, looping the recording')
+    soak_parser.add_argument('--speed', type=float, default=1.0, help='playback speed; 0 replays as fast as possible')
+    soak_parser.add_argument('--faces-dir', default=config.FACES_DIR, help='gallery images to recognize against')
+    soak_parser.add_argument('--report-interval', type=float, default=60, help='seconds between progress lines')
+    soak_parser.add_argument('--output', help='write the soak report to this JSON file')
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        source = int(args.source) if args.source.isdigit() else args.source
+        record(source, args.output, args.duration, args.quality)
+    else:
+        report = soak(args)
+        print(json.dumps(report, indent=2))
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(report, f, indent=2)
@@ -0,0 +1,127 @@
+"""Multi-process serving: one gallery owner plus N HTTP workers sharing the listening port.
+
+The owner process loads the gallery, watches the faces directories and publishes every gallery
+generation through shared memory (see shared_gallery.py); it does not serve requests itself.
+Each worker binds its own SO_REUSEPORT socket so the kernel spreads connections across them,
+attaches to the shared gallery read-only and writes visits to its own visit-log partition.
+Crashed workers are restarted by the owner.
+
+Metrics and detections would otherwise be per worker, depending on which one a request lands on:
+every process writes its metric totals to a spool directory that /metrics on any worker sums up,
+and the owner relays each worker's detections to the others so every /detections/stream is complete.
+"""
+import logging
+import multiprocessing
+import os
+import shutil
+import signal
+import socket
+import tempfile
+import threading
+import time
+
+import config
+
+RESTART_DELAY = 2.0  # seconds before a crashed worker is replaced
+RELAY_QUEUE_SIZE = 256  # frames of detections buffered per direction before they are dropped
+
+
+def make_listener(host, port):
+    if not hasattr(socket, 'SO_REUSEPORT'):
+        raise RuntimeError("NOVA_WORKERS > 1 needs SO_REUSEPORT, which this platform does not provide")
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(128)
+    return sock
+
+
+def metrics_dir(port):
+    return os.path.join(tempfile.gettempdir(), f'nova_metrics_{port}')
+
+
+def worker_main(worker_id, host, port, control_name, upstream, downstream):
+    """Entry point of a serving worker process"""
+    logging.basicConfig(
+        level=os.environ.get('NOVA_LOG_LEVEL', 'INFO').upper(),
+        format=f'%(asctime)s %(levelname)s w{worker_id} %(threadName)s %(message)s'
+    )
+    from werkzeug.serving import make_server
+    import main
+    from detection_feed import relay_worker_feed
+    from metrics import MetricsSpool
+
+    main.metrics_spool = MetricsSpool(metrics_dir(port), f'w{worker_id}')
+    main.metrics_spool.start()
+    relay_worker_feed(main.detection_feed, worker_id, upstream, downstream)
+
+    sock = make_listener(host, port)
+    threading.Thread(target=main.bootstrap_worker, args=(control_name, worker_id),
+                     name='startup', daemon=True).start()
+    server = make_server(host, port, main.app, threaded=True, fd=sock.fileno())
+    print(f"🌐 Worker {worker_id} (pid {os.getpid()}) serving on {host}:{port}")
+    server.serve_forever()
+
+
+def serve(workers, host=config.FLASK_HOST, port=config.FLASK_PORT):
+    """Run the gallery owner in this process and supervise `workers` serving processes"""
+    import main
+    from detection_feed import run_owner_relay
+    from metrics import MetricsSpool
+    from shared_gallery import SharedGalleryPublisher
+    from storage import create_store
+
+    # Totals of a previous run would otherwise be added to this one's
+    shutil.rmtree(metrics_dir(port), ignore_errors=True)
+    MetricsSpool(metrics_dir(port), 'owner').start()
+
+    publisher = SharedGalleryPublisher(f'nova_gallery_{port}')
+    context = multiprocessing.get_context('spawn')
+    processes = {}
+    stopping = threading.Event()
+
+    upstream = context.Queue(RELAY_QUEUE_SIZE)
+    downstreams = {worker_id: context.Queue(RELAY_QUEUE_SIZE) for worker_id in range(workers)}
+    run_owner_relay(upstream, downstreams)
+
+    def start_worker(worker_id):
+        process = context.Process(target=worker_main,
+                                  args=(worker_id, host, port, publisher.control_name,
+                                        upstream, downstreams[worker_id]),
+                                  name=f'nova-worker-{worker_id}', daemon=True)
+        process.start()
+        processes[worker_id] = process
+
+    def shutdown(signum, frame):
+        stopping.set()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    # Workers come up and answer /health straight away, then wait for the first generation
+    for worker_id in range(workers):
+        start_worker(worker_id)
+
+    try:
+        main.download_cascade_classifier()
+        face_system = main.FaceRecognitionSystem(store=create_store(), load_faces=False, watch_files=False)
+        face_system.load_face_data()
+        face_system.gallery.add_listener(publisher.publish)
+        face_system.setup_file_watcher()
+        threading.Thread(target=main.cleanup_old_faces, daemon=True).start()
+        print(f"✅ Gallery owner ready, supervising {workers} workers")
+
+        while not stopping.wait(1.0):
+            for worker_id, process in list(processes.items()):
+                if not process.is_alive():
+                    print(f"⚠️ Worker {worker_id} exited with code {process.exitcode}, restarting")
+                    time.sleep(RESTART_DELAY)
+                    start_worker(worker_id)
+    finally:
+        for process in processes.values():
+            process.terminate()
+        for process in processes.values():
+            process.join(timeout=5)
+        publisher.close()
+        print("👋 Stopped all workers")
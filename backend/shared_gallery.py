@@ -0,0 +1,199 @@
+"""Gallery published through POSIX shared memory so worker processes share one copy.
+
+The owner writes each gallery generation into a fresh data segment and then points a small
+control segment at it. Workers map the current data segment read-only and use its arrays in
+place, re-attaching when the generation counter moves.
+
+Control segment: int64 generation (odd while being updated), int64 name length, segment name.
+Data segment: uint64 manifest length, JSON manifest, then 64-byte aligned arrays.
+"""
+import json
+import os
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from gallery import CATEGORIES, GallerySnapshot
+
+CONTROL_SIZE = 16 + 240
+ALIGNMENT = 64
+
+
+def untrack(shm):
+    """Stop this process's resource tracker from unlinking a segment it merely attached to"""
+    try:
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    except Exception:
+        pass
+
+
+def align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+class SharedGalleryPublisher:
+    """Owner side: write every gallery generation to shared memory"""
+
+    def __init__(self, control_name):
+        self.control_name = control_name
+        try:
+            stale = shared_memory.SharedMemory(name=control_name)
+            stale.close()
+            stale.unlink()
+        except FileNotFoundError:
+            pass
+        self._control = shared_memory.SharedMemory(name=control_name, create=True, size=CONTROL_SIZE)
+        self._header = np.ndarray((2,), dtype=np.int64, buffer=self._control.buf)
+        self._header[:] = 0
+        self._segments = []  # data segments, newest last
+        self._lock = threading.Lock()
+        self.generation = 0
+
+    def publish(self, snapshots):
+        """Write {category: GallerySnapshot} as a new generation"""
+        arrays = {}
+        for category in CATEGORIES:
+            for key, array in snapshots[category].to_arrays().items():
+                arrays[f'{category}/{key}'] = np.ascontiguousarray(array)
+
+        manifest = {}
+        offset = 0
+        for key, array in arrays.items():
+            manifest[key] = {'dtype': array.dtype.str, 'shape': array.shape, 'offset': offset}
+            offset = align(offset + array.nbytes)
+        manifest_bytes = json.dumps(manifest).encode('utf-8')
+        data_start = align(8 + len(manifest_bytes))
+
+        with self._lock:
+            name = f'nova_gallery_{os.getpid()}_{self.generation + 2}'
+            segment = shared_memory.SharedMemory(name=name, create=True, size=max(data_start + offset, 1))
+            segment.buf[:8] = np.uint64(len(manifest_bytes)).tobytes()
+            segment.buf[8:8 + len(manifest_bytes)] = manifest_bytes
+            for key, array in arrays.items():
+                start = data_start + manifest[key]['offset']
+                segment.buf[start:start + array.nbytes] = array.tobytes()
+
+            # Seqlock: readers retry while the generation is odd or changes under them
+            encoded = name.encode('ascii')
+            self._header[0] = self.generation + 1
+            self._header[1] = len(encoded)
+            self._control.buf[16:16 + len(encoded)] = encoded
+            self.generation += 2
+            self._header[0] = self.generation
+
+            # Keep the previous generation around for workers that are still attaching to it
+            self._segments.append(segment)
+            while len(self._segments) > 2:
+                old = self._segments.pop(0)
+                old.close()
+                old.unlink()
+
+        print(f"📤 Published gallery generation {self.generation // 2} ({data_start + offset} bytes)")
+
+    def close(self):
+        with self._lock:
+            for segment in self._segments:
+                segment.close()
+                segment.unlink()
+            self._segments = []
+            self._control.close()
+            self._control.unlink()
+
+
+class SharedGalleryReader:
+    """Worker side: read-only gallery with the same snapshot()/count() API as FaceGallery"""
+
+    def __init__(self, control_name, wait=30.0):
+        deadline = time.monotonic() + wait
+        while True:
+            try:
+                self._control = shared_memory.SharedMemory(name=control_name)
+                break
+            except FileNotFoundError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.1)
+        untrack(self._control)
+        self._header = np.ndarray((2,), dtype=np.int64, buffer=self._control.buf)
+        self._snapshots = {category: GallerySnapshot.empty() for category in CATEGORIES}
+        self._segments = []
+        self._lock = threading.Lock()
+        self.generation = 0
+
+    def wait_for_gallery(self, timeout=None):
+        """Block until the owner has published at least one generation"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while int(self._header[0]) == 0:
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.1)
+        self._refresh()
+        return True
+
+    def snapshot(self, category):
+        if int(self._header[0]) != self.generation:
+            self._refresh()
+        return self._snapshots[category]
+
+    def count(self, category):
+        return len(self.snapshot(category))
+
+    def _read_control(self):
+        while True:
+            before = int(self._header[0])
+            if before % 2 == 1:
+                time.sleep(0.001)
+                continue
+            length = int(self._header[1])
+            name = bytes(self._control.buf[16:16 + length]).decode('ascii')
+            if int(self._header[0]) == before:
+                return before, name
+
+    def _refresh(self):
+        with self._lock:
+            for _ in range(10):
+                generation, name = self._read_control()
+                if generation == self.generation or generation == 0:
+                    return
+                try:
+                    segment = shared_memory.SharedMemory(name=name)
+                    break
+                except FileNotFoundError:
+                    # Superseded and unlinked before we got to it; read the control block again
+                    continue
+            else:
+                return
+            untrack(segment)
+
+            manifest_length = int(np.frombuffer(segment.buf[:8], dtype=np.uint64)[0])
+            manifest = json.loads(bytes(segment.buf[8:8 + manifest_length]))
+            data_start = align(8 + manifest_length)
+            arrays = {}
+            for key, entry in manifest.items():
+                array = np.ndarray(tuple(entry['shape']), dtype=np.dtype(entry['dtype']),
+                                   buffer=segment.buf, offset=data_start + entry['offset'])
+                array.setflags(write=False)
+                arrays[key] = array
+
+            self._snapshots = {
+                category: GallerySnapshot.from_arrays({
+                    key.split('/', 1)[1]: array for key, array in arrays.items() if key.startswith(f'{category}/')
+                })
+                for category in CATEGORIES
+            }
+            self.generation = generation
+            self._segments.append(segment)
+            self._release_old_segments()
+
+    def _release_old_segments(self):
+        """Unmap superseded segments once no in-flight frame holds views into them"""
+        keep = []
+        for segment in self._segments[:-1]:
+            try:
+                segment.close()
+            except BufferError:
+                keep.append(segment)
+        self._segments = keep + self._segments[-1:]
@@ -0,0 +1,63 @@
+import threading
+import time
+
+
+class StartupState:
+    """Progress of the background initialization, reported by /health and /ready"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self.started_at = time.time()
+        self.stage = 'starting'
+        self.stage_started_at = self.started_at
+        self.progress = None
+        self.error = None
+        self.timings = {}
+        self.ready_at = None
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    def set_stage(self, stage):
+        with self._lock:
+            now = time.time()
+            self.timings[self.stage] = round(now - self.stage_started_at, 3)
+            self.stage = stage
+            self.stage_started_at = now
+            self.progress = None
+        print(f"🚀 Startup: {stage}")
+
+    def set_progress(self, done, total):
+        self.progress = {'done': done, 'total': total}
+
+    def mark_ready(self):
+        with self._lock:
+            now = time.time()
+            self.timings[self.stage] = round(now - self.stage_started_at, 3)
+            self.stage = 'ready'
+            self.progress = None
+            self.ready_at = now
+        self._ready.set()
+        print(f"✅ Ready in {self.ready_at - self.started_at:.1f}s")
+
+    def fail(self, error):
+        with self._lock:
+            self.error = str(error)
+        print(f"❌ Startup failed during {self.stage}: {error}")
+
+    def wait(self, timeout=None):
+        return self._ready.wait(timeout)
+
+    def status(self):
+        with self._lock:
+            return {
+                'ready': self.ready,
+                'stage': self.stage,
+                'progress': self.progress,
+                'error': self.error,
+                'uptime': round(time.time() - self.started_at, 3),
+                'startup_seconds': round(self.ready_at - self.started_at, 3) if self.ready_at else None,
+                'timings': dict(self.timings),
+            }
@@ -0,0 +1,415 @@
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+
+import config
+import metrics
+
+
+class DataStore(ABC):
+    """Profile, visit and live detection storage used by the recognition system"""
+
+    @abstractmethod
+    def get_profiles(self, category):
+        """Return every profile in a category as {key: data}"""
+
+    @abstractmethod
+    def get_profile(self, category, key):
+        """Return one profile, or None"""
+
+    @abstractmethod
+    def update_profiles(self, category, changes):
+        """Apply {key: fields} in one write; fields=None deletes the profile, a field value of None deletes the field"""
+
+    def update_profile(self, category, key, fields):
+        self.update_profiles(category, {key: fields})
+
+    @abstractmethod
+    def has_visits(self):
+        """True if any visit has been stored"""
+
+    @abstractmethod
+    def add_visit(self, visit, key=None):
+        """Store a visit record, under key if given"""
+
+    @abstractmethod
+    def get_last_unknown_greeting(self):
+        """Time of the last greeting of an unknown visitor"""
+
+    @abstractmethod
+    def set_last_unknown_greeting(self, greeting_time):
+        """Record the time of the last greeting of an unknown visitor"""
+
+    @abstractmethod
+    def set_current_detections(self, detections):
+        """Replace the list of faces currently in view"""
+
+
+class FirebaseStore(DataStore):
+    """Firebase Realtime Database backend"""
+
+    def __init__(self, key_path=config.FIREBASE_KEY_PATH, database_url=config.FIREBASE_DATABASE_URL):
+        import firebase_admin
+        from firebase_admin import credentials, db
+
+        if not firebase_admin._apps:
+            cred = credentials.Certificate(key_path)
+            firebase_admin.initialize_app(cred, {'databaseURL': database_url})
+        self.ref = db.reference('/')
+
+    def get_profiles(self, category):
+        profiles = self.ref.child(category).get() or {}
+        if isinstance(profiles, list):
+            profiles = {str(i): profile for i, profile in enumerate(profiles) if profile is not None}
+        return profiles
+
+    def get_profile(self, category, key):
+        return self.ref.child(category).child(key).get()
+
+    def update_profiles(self, category, changes):
+        updates = {}
+        for key, fields in changes.items():
+            if fields is None:
+                updates[key] = None
+                continue
+            for field, value in fields.items():
+                updates[f'{key}/{field}'] = value
+        if updates:
+            self.ref.child(category).update(updates)
+
+    def has_visits(self):
+        # Only fetch a single child to test for emptiness instead of the whole node
+        return bool(self.ref.child('visits').order_by_key().limit_to_first(1).get())
+
+    def add_visit(self, visit, key=None):
+        visits_ref = self.ref.child('visits')
+        if key is None:
+            visits_ref.push().set(visit)
+        else:
+            visits_ref.child(key).set(visit)
+
+    def get_last_unknown_greeting(self):
+        return self.ref.child('unknown_visitors').child('last_greeting').get()
+
+    def set_last_unknown_greeting(self, greeting_time):
+        self.ref.child('unknown_visitors').update({'last_greeting': greeting_time})
+
+    def set_current_detections(self, detections):
+        detections_ref = self.ref.child('currentDetections')
+        if detections:
+            detections_ref.set({str(idx): detection for idx, detection in enumerate(detections)})
+        else:
+            detections_ref.delete()
+
+
+class SQLiteStore(DataStore):
+    """Embedded local backend, optionally replicated to another store with sync_to()"""
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS profiles (
+            category TEXT NOT NULL,
+            key TEXT NOT NULL,
+            data TEXT,
+            dirty INTEGER NOT NULL DEFAULT 0,
+            changes TEXT,
+            remote INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (category, key)
+        );
+        CREATE TABLE IF NOT EXISTS visits (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            key TEXT,
+            data TEXT NOT NULL,
+            synced INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE TABLE IF NOT EXISTS state (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+    '''
+
+    def __init__(self, path=config.LOCAL_DATASTORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        if path != ':memory:':
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(self.SCHEMA)
+        columns = {row[1] for row in self._conn.execute('PRAGMA table_info(profiles)')}
+        if 'changes' not in columns:
+            # Databases from before field-level sync: clean rows came from the remote
+            self._conn.execute('ALTER TABLE profiles ADD COLUMN changes TEXT')
+            self._conn.execute('ALTER TABLE profiles ADD COLUMN remote INTEGER NOT NULL DEFAULT 0')
+            self._conn.execute('UPDATE profiles SET remote = 1 WHERE dirty = 0')
+        self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def get_profiles(self, category):
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT key, data FROM profiles WHERE category = ? AND data IS NOT NULL', (category,)
+            ).fetchall()
+        return {key: json.loads(data) for key, data in rows}
+
+    def get_profile(self, category, key):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT data FROM profiles WHERE category = ? AND key = ?', (category, key)
+            ).fetchone()
+        return json.loads(row[0]) if row and row[0] is not None else None
+
+    def update_profiles(self, category, changes, dirty=True):
+        with self._lock, self._conn:
+            for key, fields in changes.items():
+                row = self._conn.execute(
+                    'SELECT data, dirty, changes, remote FROM profiles WHERE category = ? AND key = ?',
+                    (category, key)
+                ).fetchone()
+                remote = row[3] if row else 0
+                if fields is None:
+                    # Keep a tombstone so the deletion can be replicated
+                    self._conn.execute(
+                        'INSERT OR REPLACE INTO profiles (category, key, data, dirty, changes, remote) '
+                        'VALUES (?, ?, NULL, ?, NULL, ?)',
+                        (category, key, int(dirty), remote)
+                    )
+                    continue
+                data = _apply_fields(json.loads(row[0]) if row and row[0] is not None else {}, fields)
+                # Fields changed since the last sync; only these are pushed to the remote
+                pending = _pending_fields(row) if row else {}
+                if dirty:
+                    pending.update(fields)
+                    row_dirty, row_changes = 1, json.dumps(pending)
+                else:
+                    row_dirty, row_changes = (row[1], row[2]) if row else (0, None)
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO profiles (category, key, data, dirty, changes, remote) '
+                    'VALUES (?, ?, ?, ?, ?, ?)',
+                    (category, key, json.dumps(data), row_dirty, row_changes, remote)
+                )
+
+    def has_visits(self):
+        with self._lock:
+            return self._conn.execute('SELECT 1 FROM visits LIMIT 1').fetchone() is not None
+
+    def add_visit(self, visit, key=None):
+        with self._lock, self._conn:
+            self._conn.execute('INSERT INTO visits (key, data) VALUES (?, ?)', (key, json.dumps(visit)))
+
+    def get_last_unknown_greeting(self):
+        return self._get_state('last_unknown_greeting')
+
+    def set_last_unknown_greeting(self, greeting_time):
+        self._set_state('last_unknown_greeting', greeting_time)
+
+    def set_current_detections(self, detections):
+        self._set_state('current_detections', detections)
+
+    def get_current_detections(self):
+        return self._get_state('current_detections') or []
+
+    def _get_state(self, key):
+        with self._lock:
+            row = self._conn.execute('SELECT value FROM state WHERE key = ?', (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _set_state(self, key, value):
+        with self._lock, self._conn:
+            self._conn.execute('INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)', (key, json.dumps(value)))
+
+    def sync_to(self, remote, categories=('staff', 'customers')):
+        """Push local field changes and visits to remote, then refresh clean profiles from it.
+
+        Only the fields changed locally are pushed, so edits made to other fields elsewhere (the
+        dashboard) survive. Remote profiles are read first: a profile deleted remotely since the
+        last sync is dropped locally instead of being recreated by a pending visit update.
+        """
+        remote_profiles = {category: remote.get_profiles(category) for category in categories}
+        with self._lock:
+            dirty = self._conn.execute(
+                'SELECT category, key, data, changes, remote FROM profiles WHERE dirty = 1'
+            ).fetchall()
+            visits = self._conn.execute('SELECT id, key, data FROM visits WHERE synced = 0 ORDER BY id').fetchall()
+
+        changes = {}
+        dropped = []
+        for category, key, data, pending, known in dirty:
+            if data is not None and known and category in remote_profiles and key not in remote_profiles[category]:
+                dropped.append((category, key))
+                continue
+            changes.setdefault(category, {})[key] = (
+                None if data is None else _pending_fields((data, 1, pending))
+            )
+        for category, category_changes in changes.items():
+            remote.update_profiles(category, category_changes)
+        for visit_id, key, data in visits:
+            remote.add_visit(json.loads(data), key=key)
+
+        with self._lock, self._conn:
+            # Rows changed again while we were pushing stay dirty for the next round
+            for category, key, data, pending, known in dirty:
+                if data is None:
+                    self._conn.execute(
+                        'DELETE FROM profiles WHERE category = ? AND key = ? AND dirty = 1 AND data IS NULL',
+                        (category, key)
+                    )
+                else:
+                    self._conn.execute(
+                        'UPDATE profiles SET dirty = 0, changes = NULL, remote = 1 '
+                        'WHERE category = ? AND key = ? AND data = ? AND changes IS ?',
+                        (category, key, data, pending)
+                    )
+            self._conn.executemany(
+                'DELETE FROM profiles WHERE category = ? AND key = ? AND data IS NOT NULL', dropped
+            )
+            self._conn.executemany('UPDATE visits SET synced = 1 WHERE id = ?', [(row[0],) for row in visits])
+
+        for category in categories:
+            # What the remote holds now: the profiles read above plus what we just pushed
+            profiles = {key: data for key, data in remote_profiles[category].items() if isinstance(data, dict)}
+            for key, fields in changes.get(category, {}).items():
+                if fields is None:
+                    profiles.pop(key, None)
+                else:
+                    profiles[key] = _apply_fields(profiles.get(key, {}), fields)
+
+            with self._lock, self._conn:
+                pending = self._conn.execute(
+                    'SELECT key, data, changes FROM profiles WHERE category = ? AND dirty = 1', (category,)
+                ).fetchall()
+                self._conn.execute(
+                    'DELETE FROM profiles WHERE category = ? AND dirty = 0', (category,)
+                )
+                pending_keys = {key for key, _, _ in pending}
+                self._conn.executemany(
+                    'INSERT INTO profiles (category, key, data, dirty, changes, remote) VALUES (?, ?, ?, 0, NULL, 1)',
+                    [(category, key, json.dumps(data)) for key, data in profiles.items() if key not in pending_keys]
+                )
+                # Still-pending rows take the remote's other fields with their own changes on top
+                self._conn.executemany(
+                    'UPDATE profiles SET data = ?, remote = 1 WHERE category = ? AND key = ? AND dirty = 1',
+                    [(json.dumps(_apply_fields(profiles[key], json.loads(row_changes))), category, key)
+                     for key, data, row_changes in pending
+                     if data is not None and row_changes is not None and key in profiles]
+                )
+
+        return len(dirty) - len(dropped), len(visits)
+
+
+def _apply_fields(data, fields):
+    """data with fields set, a None value removing the field"""
+    data = dict(data)
+    for field, value in fields.items():
+        if value is None:
+            data.pop(field, None)
+        else:
+            data[field] = value
+    return data
+
+
+def _pending_fields(row):
+    """Fields of a (data, dirty, changes, ...) row still to be pushed"""
+    data, dirty, changes = row[0], row[1], row[2]
+    if not dirty or data is None:
+        return {}
+    if changes is None:
+        return json.loads(data)  # dirty before changes were tracked per field
+    return json.loads(changes)
+
+
+def start_periodic_sync(local, remote, interval):
+    """Replicate a local store to a remote one every interval seconds in the background"""
+    def sync_loop():
+        while True:
+            time.sleep(interval)
+            try:
+                profiles, visits = local.sync_to(remote)
+                if profiles or visits:
+                    print(f"🔄 Synced {profiles} profiles and {visits} visits to remote datastore")
+            except Exception as e:
+                print(f"❌ Datastore sync failed: {str(e)}")
+
+    thread = threading.Thread(target=sync_loop, name='datastore-sync', daemon=True)
+    thread.start()
+    return thread
+
+
+def create_store(backend=None, sync=True):
+    """Create the datastore selected by config.DATASTORE_BACKEND.
+
+    sync=False skips the periodic remote sync, for extra processes sharing a local store.
+    """
+    backend = backend or config.DATASTORE_BACKEND
+    if backend == 'firebase':
+        return InstrumentedStore(FirebaseStore())
+    if backend == 'local':
+        store = SQLiteStore()
+        if sync and config.DATASTORE_SYNC_INTERVAL > 0:
+            try:
+                remote = FirebaseStore()
+                # Start from the remote state; a new local file would otherwise look like no visits yet
+                store.sync_to(remote)
+                start_periodic_sync(store, remote, config.DATASTORE_SYNC_INTERVAL)
+                print(f"✅ Local datastore will sync every {config.DATASTORE_SYNC_INTERVAL}s")
+            except Exception as e:
+                print(f"⚠️ Remote sync unavailable, running fully local: {str(e)}")
+        return InstrumentedStore(store)
+    raise ValueError(f"Unknown datastore backend: {backend}")
+
+
+class InstrumentedStore(DataStore):
+    """Wraps a DataStore and records latency and errors of every call"""
+
+    def __init__(self, store):
+        self._store = store
+
+    def _call(self, name, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return getattr(self._store, name)(*args, **kwargs)
+        except Exception:
+            metrics.DATASTORE_ERRORS_TOTAL.inc(operation=name)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            metrics.DATASTORE_SECONDS.observe(elapsed, operation=name)
+            metrics.STAGE_SECONDS.observe(elapsed, stage='datastore')
+
+    def get_profiles(self, category):
+        return self._call('get_profiles', category)
+
+    def get_profile(self, category, key):
+        return self._call('get_profile', category, key)
+
+    def update_profiles(self, category, changes):
+        return self._call('update_profiles', category, changes)
+
+    def update_profile(self, category, key, fields):
+        return self._call('update_profile', category, key, fields)
+
+    def has_visits(self):
+        return self._call('has_visits')
+
+    def add_visit(self, visit, key=None):
+        return self._call('add_visit', visit, key=key)
+
+    def get_last_unknown_greeting(self):
+        return self._call('get_last_unknown_greeting')
+
+    def set_last_unknown_greeting(self, greeting_time):
+        return self._call('set_last_unknown_greeting', greeting_time)
+
+    def set_current_detections(self, detections):
+        return self._call('set_current_detections', detections)
+
+    def __getattr__(self, name):
+        # Backend-specific extras (close, sync_to, ...) are timed the same way
+        attr = getattr(self._store, name)
+        if not callable(attr) or name.startswith('_'):
+            return attr
+        return lambda *args, **kwargs: self._call(name, *args, **kwargs)
@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+from gallery import ENCODING_SIZE, GallerySnapshot, identity_name
+
+
+def random_gallery(rng, identities=40, templates=3):
+    keys, encodings = [], []
+    for i in range(identities):
+        center = rng.normal(0, 1, ENCODING_SIZE)
+        for j in range(templates):
+            keys.append(f'person{i}' if j == 0 else f'person{i}@{j}')
+            encodings.append(center + rng.normal(0, 0.05, ENCODING_SIZE))
+    return keys, np.array(encodings)
+
+
+def brute_force(keys, encodings, query):
+    distances = np.linalg.norm(encodings - query, axis=1)
+    best = int(np.argmin(distances))
+    return identity_name(keys[best]), float(distances[best])
+
+
+def assert_matches_brute_force(snapshot, keys, encodings, queries, tolerance):
+    for query in queries:
+        name, distance = brute_force(keys, encodings, query)
+        match = snapshot.match(query)
+        assert match.name == name
+        assert match.distance == pytest.approx(distance, rel=tolerance, abs=tolerance)
+
+
+TOLERANCES = {('float16', True): 1e-3, ('int8', True): 1e-3, ('float16', False): 1e-3, ('int8', False): 2e-2}
+
+
+@pytest.mark.parametrize('dtype,rerank', list(TOLERANCES))
+def test_match_agrees_with_brute_force(dtype, rerank):
+    rng = np.random.default_rng(0)
+    keys, encodings = random_gallery(rng)
+    snapshot = GallerySnapshot.from_encodings(keys, encodings, dtype, rerank)
+    queries = encodings[rng.choice(len(keys), 20)] + rng.normal(0, 0.05, (20, ENCODING_SIZE))
+
+    assert len(snapshot) == 40
+    assert_matches_brute_force(snapshot, keys, encodings, queries, TOLERANCES[dtype, rerank])
+
+
+@pytest.mark.parametrize('dtype,rerank', list(TOLERANCES))
+def test_updated_agrees_with_brute_force(dtype, rerank):
+    rng = np.random.default_rng(1)
+    keys, encodings = random_gallery(rng)
+    snapshot = GallerySnapshot.from_encodings(keys, encodings, dtype, rerank)
+
+    new_person = rng.normal(0, 1, ENCODING_SIZE)
+    upserts = {
+        'person3@1': encodings[keys.index('person3@1')] + 0.01,  # replaced
+        'newcomer': new_person,
+        'newcomer@1': new_person + rng.normal(0, 0.05, ENCODING_SIZE),
+    }
+    removals = {'person5', 'person5@1', 'person5@2', 'person7@2'}
+    updated = snapshot.updated(upserts, removals)
+
+    expected = {key: encoding for key, encoding in zip(keys, encodings) if key not in removals}
+    expected.update(upserts)
+    expected_keys = list(expected)
+    expected_encodings = np.array(list(expected.values()))
+
+    assert sorted(updated.keys) == sorted(expected_keys)
+    assert len(updated) == 40
+    assert 'person5' not in list(updated.names)
+    assert sorted(updated.template_keys('newcomer')) == ['newcomer', 'newcomer@1']
+    assert sorted(updated.template_keys('person7')) == ['person7', 'person7@1']
+
+    queries = expected_encodings[rng.choice(len(expected_keys), 20)] + rng.normal(0, 0.05, (20, ENCODING_SIZE))
+    assert_matches_brute_force(updated, expected_keys, expected_encodings, queries, TOLERANCES[dtype, rerank])
+    # The removed identity's own templates now resolve to someone else
+    assert updated.match(encodings[keys.index('person5')]).name != 'person5'
+
+
+def test_round_trip_through_arrays():
+    rng = np.random.default_rng(2)
+    keys, encodings = random_gallery(rng, identities=10)
+    for rerank in (True, False):
+        snapshot = GallerySnapshot.from_encodings(keys, encodings, 'int8', rerank)
+        restored = GallerySnapshot.from_arrays(snapshot.to_arrays())
+        for query in encodings[:5]:
+            assert restored.match(query).name == snapshot.match(query).name
+
+
+def test_empty_gallery_matches_nothing():
+    snapshot = GallerySnapshot.empty()
+    assert snapshot.match(np.zeros(ENCODING_SIZE)) is None
+    assert snapshot.updated({'alice': np.ones(ENCODING_SIZE)}, set()).best_match(np.ones(ENCODING_SIZE), 0.1) == 'alice'
@@ -0,0 +1,102 @@
+import os
+
+import pytest
+
+import migrate_image_names
+from storage import SQLiteStore
+
+
+class Crash(BaseException):
+    """Stands in for the process dying; not caught by the migration's per-step handlers"""
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    for category in migrate_image_names.CATEGORIES:
+        os.makedirs(tmp_path / 'faces' / category)
+    return tmp_path
+
+
+@pytest.fixture
+def store():
+    store = SQLiteStore(':memory:')
+    # Each profile's image carries the other one's target name, so the renames are a swap
+    store.update_profiles('staff', {
+        'p1': {'name': 'Alice', 'imagePath': '/faces/staff/bob.jpg'},
+        'p2': {'name': 'Bob', 'imagePath': '/faces/staff/alice.jpg'},
+    })
+    yield store
+    store.close()
+
+
+def write_files(workdir, files):
+    for name, content in files.items():
+        (workdir / 'faces' / 'staff' / name).write_text(content)
+
+
+def read_files(workdir):
+    directory = workdir / 'faces' / 'staff'
+    return {name: (directory / name).read_text() for name in os.listdir(directory)}
+
+
+def crash_on_rename(monkeypatch, call):
+    rename = os.rename
+    calls = []
+
+    def flaky_rename(source, target):
+        calls.append(source)
+        if len(calls) == call:
+            raise Crash()
+        rename(source, target)
+    monkeypatch.setattr(migrate_image_names.os, 'rename', flaky_rename)
+
+
+EXPECTED = {'alice.jpg': 'alice', 'alice@2.jpg': 'alice 2', 'bob.jpg': 'bob'}
+
+
+def test_swap_renames_primary_and_templates(workdir, store):
+    write_files(workdir, {'bob.jpg': 'alice', 'bob@2.jpg': 'alice 2', 'alice.jpg': 'bob'})
+
+    migrate_image_names.migrate_image_names(store)
+
+    assert read_files(workdir) == EXPECTED
+    assert store.get_profile('staff', 'p1')['imagePath'] == '/faces/staff/alice.jpg'
+    assert store.get_profile('staff', 'p2')['imagePath'] == '/faces/staff/bob.jpg'
+    assert not os.path.exists(migrate_image_names.PROGRESS_FILE)
+
+
+@pytest.mark.parametrize('call', [1, 2, 3, 4, 5, 6])
+def test_resume_after_crash(workdir, store, monkeypatch, call):
+    """Calls 1-3 stage files under temporary names, 4-6 move them to their targets"""
+    write_files(workdir, {'bob.jpg': 'alice', 'bob@2.jpg': 'alice 2', 'alice.jpg': 'bob'})
+    with monkeypatch.context() as patch:
+        crash_on_rename(patch, call)
+        with pytest.raises(Crash):
+            migrate_image_names.migrate_image_names(store)
+    assert os.path.exists(migrate_image_names.PROGRESS_FILE)
+
+    migrate_image_names.migrate_image_names(store)
+
+    assert read_files(workdir) == EXPECTED
+    assert store.get_profile('staff', 'p1')['imagePath'] == '/faces/staff/alice.jpg'
+    assert store.get_profile('staff', 'p2')['imagePath'] == '/faces/staff/bob.jpg'
+
+
+def test_failed_rename_is_finished_by_the_next_run(workdir, store, monkeypatch):
+    write_files(workdir, {'bob.jpg': 'alice', 'bob@2.jpg': 'alice 2', 'alice.jpg': 'bob'})
+    with monkeypatch.context() as patch:
+        rename = os.rename
+
+        def failing_rename(source, target):
+            if os.path.basename(target) == 'bob.jpg':
+                raise OSError('disk error')
+            rename(source, target)
+        patch.setattr(migrate_image_names.os, 'rename', failing_rename)
+        migrate_image_names.migrate_image_names(store)
+    assert os.path.exists(migrate_image_names.PROGRESS_FILE)
+
+    migrate_image_names.migrate_image_names(store)
+
+    assert read_files(workdir) == EXPECTED
+    assert store.get_profile('staff', 'p2')['imagePath'] == '/faces/staff/bob.jpg'
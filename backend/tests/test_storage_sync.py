@@ -0,0 +1,120 @@
+import copy
+
+import pytest
+
+from storage import SQLiteStore
+
+
+class FakeRemote:
+    """In-memory stand-in for FirebaseStore that records what sync_to pushes"""
+
+    def __init__(self, profiles=None):
+        self.profiles = copy.deepcopy(profiles or {'staff': {}, 'customers': {}})
+        self.pushed = []
+        self.visits = []
+        self.on_update = None
+
+    def get_profiles(self, category):
+        return copy.deepcopy(self.profiles.get(category, {}))
+
+    def update_profiles(self, category, changes):
+        self.pushed.append((category, copy.deepcopy(changes)))
+        profiles = self.profiles.setdefault(category, {})
+        for key, fields in changes.items():
+            if fields is None:
+                profiles.pop(key, None)
+            else:
+                profiles.setdefault(key, {}).update(fields)
+        if self.on_update is not None:
+            self.on_update()
+
+    def add_visit(self, visit, key=None):
+        self.visits.append((key, visit))
+
+
+@pytest.fixture
+def synced():
+    remote = FakeRemote({'staff': {}, 'customers': {
+        'ann': {'name': 'Ann', 'phone': '111', 'visits': 1},
+        'bob': {'name': 'Bob', 'visits': 3},
+    }})
+    local = SQLiteStore(':memory:')
+    local.sync_to(remote)
+    remote.pushed.clear()
+    yield local, remote
+    local.close()
+
+
+def test_initial_sync_pulls_remote_profiles(synced):
+    local, remote = synced
+    assert local.get_profiles('customers') == remote.profiles['customers']
+
+
+def test_only_changed_fields_are_pushed(synced):
+    local, remote = synced
+    local.update_profile('customers', 'ann', {'visits': 2})
+    remote.profiles['customers']['ann']['phone'] = '222'  # edited on the dashboard meanwhile
+
+    assert local.sync_to(remote) == (1, 0)
+
+    assert remote.pushed == [('customers', {'ann': {'visits': 2}})]
+    assert remote.profiles['customers']['ann'] == {'name': 'Ann', 'phone': '222', 'visits': 2}
+    assert local.get_profile('customers', 'ann') == remote.profiles['customers']['ann']
+
+
+def test_nothing_pushed_without_local_changes(synced):
+    local, remote = synced
+    assert local.sync_to(remote) == (0, 0)
+    assert remote.pushed == []
+
+
+def test_remote_deletion_is_not_undone(synced):
+    local, remote = synced
+    local.update_profile('customers', 'bob', {'visits': 4})
+    del remote.profiles['customers']['bob']
+
+    assert local.sync_to(remote) == (0, 0)
+
+    assert 'bob' not in remote.profiles['customers']
+    assert local.get_profile('customers', 'bob') is None
+
+
+def test_local_deletion_is_pushed(synced):
+    local, remote = synced
+    local.update_profile('customers', 'bob', None)
+
+    local.sync_to(remote)
+
+    assert 'bob' not in remote.profiles['customers']
+    assert local.get_profile('customers', 'bob') is None
+
+
+def test_new_local_profile_is_pushed(synced):
+    local, remote = synced
+    local.update_profile('staff', 'cat', {'name': 'Cat'})
+    local.add_visit({'name': 'Cat', 'category': 'staff'}, key='v1')
+
+    assert local.sync_to(remote) == (1, 1)
+
+    assert remote.profiles['staff']['cat'] == {'name': 'Cat'}
+    assert remote.visits == [('v1', {'name': 'Cat', 'category': 'staff'})]
+    assert local.sync_to(remote) == (0, 0)
+
+
+def test_row_changed_during_push_stays_dirty(synced):
+    local, remote = synced
+    local.update_profile('customers', 'ann', {'visits': 2})
+
+    def change_again():
+        remote.on_update = None
+        local.update_profile('customers', 'ann', {'visits': 3})
+    remote.on_update = change_again
+
+    local.sync_to(remote)
+    assert remote.profiles['customers']['ann']['visits'] == 2
+    assert local.get_profile('customers', 'ann')['visits'] == 3
+
+    remote.pushed.clear()
+    local.sync_to(remote)
+    assert remote.pushed == [('customers', {'ann': {'visits': 3}})]
+    assert remote.profiles['customers']['ann'] == {'name': 'Ann', 'phone': '111', 'visits': 3}
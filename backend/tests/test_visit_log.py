@@ -0,0 +1,78 @@
+import json
+import os
+from datetime import date
+
+import pytest
+
+import visit_log
+from visit_log import VisitLog, parse_category
+
+DAY = date(2026, 3, 14)
+
+
+def visit(name, category, hour):
+    return {'name': name, 'category': category, 'time': f'{DAY.isoformat()}T{hour:02d}:15:00'}
+
+
+def crash(log):
+    """Drop a log without close(), as a killed process would: the rollup is not rewritten"""
+    log._open_file.close()
+
+
+@pytest.fixture
+def stale_rollup(tmp_path, monkeypatch):
+    # Only the first append writes the rollup; later ones are covered by the segment alone
+    monkeypatch.setattr(visit_log, 'ROLLUP_FLUSH_INTERVAL', -1)
+    log = VisitLog(str(tmp_path))
+    log.append(visit('Ann', 'customer', 9))
+    monkeypatch.setattr(visit_log, 'ROLLUP_FLUSH_INTERVAL', 3600)
+    log.append(visit('Ann', 'customer', 10))
+    log.append(visit('Ben', 'staff', 10))
+    crash(log)
+    return tmp_path
+
+
+def test_rollup_on_disk_lags_segment(stale_rollup):
+    with open(stale_rollup / f'{DAY.isoformat()}.rollup.json') as f:
+        assert json.load(f)['total'] == 1
+
+
+def test_rollup_is_caught_up_from_segment_tail(stale_rollup):
+    stats = VisitLog(str(stale_rollup)).stats(DAY, DAY)
+
+    assert stats['total'] == 3
+    assert stats['categories'] == {'customer': 2, 'staff': 1}
+    assert stats['people'] == {'customer/Ann': 2, 'staff/Ben': 1}
+    assert stats['hours'] == {'09': 1, '10': 2}
+    assert stats['days'] == {DAY.isoformat(): 3}
+
+
+def test_partial_last_line_is_ignored(stale_rollup):
+    with open(stale_rollup / f'{DAY.isoformat()}.jsonl', 'ab') as f:
+        f.write(b'{"name":"Cy","category":"sta')
+
+    log = VisitLog(str(stale_rollup))
+    assert log.stats(DAY, DAY)['total'] == 3
+    assert [v['name'] for v in log.records(DAY)] == ['Ann', 'Ann', 'Ben']
+
+
+def test_appending_after_recovery_continues_the_rollup(stale_rollup):
+    log = VisitLog(str(stale_rollup))
+    log.append(visit('Cy', 'unknown', 11))
+    log.close()
+
+    with open(stale_rollup / f'{DAY.isoformat()}.rollup.json') as f:
+        rollup = json.load(f)
+    assert rollup['total'] == 4
+    assert rollup['offset'] == os.path.getsize(stale_rollup / f'{DAY.isoformat()}.jsonl')
+    assert VisitLog(str(stale_rollup)).stats(DAY, DAY, category='customer')['total'] == 2
+
+
+def test_writers_are_combined(tmp_path):
+    for writer, name in (('w0', 'Ann'), ('w1', 'Ben')):
+        log = VisitLog(str(tmp_path), writer=writer)
+        log.append(visit(name, 'customer', 12))
+        log.close()
+
+    stats = VisitLog(str(tmp_path)).stats(DAY, DAY, category=parse_category('customers'))
+    assert stats['people'] == {'customer/Ann': 1, 'customer/Ben': 1}
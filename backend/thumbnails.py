@@ -0,0 +1,113 @@
+"""Sized variants of the images under faces/ for /faces/<path>?size=N.
+
+A variant is a JPEG whose longer side is the smallest of config.THUMBNAIL_SIZES at least as large
+as the requested size. It is generated once, on first request, into THUMBNAIL_CACHE_DIR and
+stamped with the modification time of its source, so a variant is only reused while the source
+is unchanged; that check is a stat and holds in every worker process, whether or not it runs the
+file watcher. The watcher still deletes variants of changed files so stale ones don't linger.
+Images already no larger than the requested size are served as they are.
+"""
+import logging
+import os
+import stat
+import threading
+
+import cv2
+from werkzeug.security import safe_join
+
+import config
+
+logger = logging.getLogger('nova')
+
+JPEG_QUALITY = 85
+
+
+class ThumbnailCache:
+    def __init__(self, root=None, cache_dir=None, sizes=None):
+        self.root = os.path.abspath(root or config.FACES_DIR)
+        self.cache_dir = cache_dir or config.THUMBNAIL_CACHE_DIR
+        self.sizes = tuple(sorted(sizes or config.THUMBNAIL_SIZES))
+        self._lock = threading.Lock()
+        self._originals = {}  # (source, size) -> source mtime_ns of images too small to shrink
+
+    def snap(self, size):
+        """Allowed variant size for a requested size; 0 means the original"""
+        if size <= 0:
+            return 0
+        for allowed in self.sizes:
+            if allowed >= size:
+                return allowed
+        return self.sizes[-1]
+
+    def lookup(self, filename, size=0):
+        """(path, etag, mtime) to serve for a file under root; raises FileNotFoundError"""
+        source = safe_join(self.root, filename)
+        if source is None:
+            raise FileNotFoundError(filename)
+        st = os.stat(source)
+        if not stat.S_ISREG(st.st_mode):
+            raise FileNotFoundError(filename)
+        etag = f'{st.st_mtime_ns:x}-{st.st_size:x}'
+
+        size = self.snap(size)
+        if size and self._originals.get((source, size)) != st.st_mtime_ns:
+            variant = self._variant(source, filename, size, st)
+            if variant is not None:
+                return variant, f'{etag}-{size}', st.st_mtime
+        return source, etag, st.st_mtime
+
+    def _cache_path(self, filename, size):
+        return os.path.join(self.cache_dir, str(size), os.path.normpath(filename) + '.jpg')
+
+    def _variant(self, source, filename, size, st):
+        path = self._cache_path(filename, size)
+        if self._fresh(path, st):
+            return path
+        with self._lock:
+            if self._fresh(path, st):
+                return path
+            image = cv2.imread(source, cv2.IMREAD_COLOR)
+            if image is None:
+                return None  # not an image OpenCV can read; serve it untouched
+            height, width = image.shape[:2]
+            scale = size / max(width, height)
+            if scale >= 1:
+                self._originals[(source, size)] = st.st_mtime_ns
+                return None
+            thumbnail = cv2.resize(image, (max(1, round(width * scale)), max(1, round(height * scale))),
+                                   interpolation=cv2.INTER_AREA)
+            ret, buffer = cv2.imencode('.jpg', thumbnail, [int(cv2.IMWRITE_JPEG_QUALITY), JPEG_QUALITY])
+            if not ret:
+                return None
+
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f'{path}.{os.getpid()}.tmp'
+            with open(temp_path, 'wb') as f:
+                f.write(buffer.tobytes())
+            # The variant carries its source's mtime; a mismatch later means it is stale
+            os.utime(temp_path, ns=(st.st_atime_ns, st.st_mtime_ns))
+            os.replace(temp_path, path)
+            return path
+
+    @staticmethod
+    def _fresh(path, st):
+        try:
+            return os.stat(path).st_mtime_ns == st.st_mtime_ns
+        except FileNotFoundError:
+            return False
+
+    def invalidate(self, source):
+        """Drop every variant of a source file (called for watcher events and deletions)"""
+        source = os.path.abspath(source)
+        filename = os.path.relpath(source, self.root)
+        if filename.startswith(os.pardir):
+            return
+        with self._lock:
+            for size in self.sizes:
+                self._originals.pop((source, size), None)
+                try:
+                    os.remove(self._cache_path(filename, size))
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    logger.warning(f"⚠️ Could not remove thumbnail of {filename}: {str(e)}")
@@ -0,0 +1,237 @@
+import json
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+
+import config
+
+ROLLUP_FLUSH_INTERVAL = 5.0  # seconds between rollup writes for the open partition
+ROLLUP_CACHE_SIZE = 64  # closed partitions kept in memory
+# Visits are recorded under 'customer'; the profile APIs call the same people 'customers'
+VISIT_CATEGORIES = {'staff': 'staff', 'customers': 'customer', 'customer': 'customer',
+                    'unknown': 'unknown', 'system': 'system'}
+
+
+def empty_rollup():
+    return {'total': 0, 'categories': {}, 'people': {}, 'hours': {}, 'offset': 0}
+
+
+def fold_visit(rollup, visit):
+    """Add one visit record to a daily rollup"""
+    rollup['total'] += 1
+    category = visit.get('category', 'unknown')
+    rollup['categories'][category] = rollup['categories'].get(category, 0) + 1
+    if category != 'unknown':
+        person = f"{category}/{visit.get('name', '')}"
+        rollup['people'][person] = rollup['people'].get(person, 0) + 1
+    hour = visit.get('time', '')[11:13]
+    if hour:
+        rollup['hours'][hour] = rollup['hours'].get(hour, 0) + 1
+
+
+class VisitLog:
+    """Append-only visit log split into daily segment files with per-day rollups.
+
+    Each day has a `<date>.jsonl` segment and a `<date>.rollup.json` summary recording how many
+    bytes of the segment it covers, so a rollup left stale by a crash is caught up from the tail.
+    Processes sharing a directory pass distinct `writer` names and get their own
+    `<date>.<writer>.jsonl` segments; queries combine every writer's partitions for a day.
+    """
+
+    def __init__(self, directory=config.VISIT_LOG_DIR, replicate_to=None, writer=None):
+        self.directory = directory
+        self.writer = writer
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._open_day = None
+        self._open_file = None
+        self._open_rollup = None
+        self._last_rollup_flush = 0.0
+        self._rollup_cache = OrderedDict()
+
+        self._replica = replicate_to
+        self._replication_queue = None
+        if replicate_to is not None:
+            self._replication_queue = queue.Queue(maxsize=10000)
+            threading.Thread(target=self._replicate, name='visit-replication', daemon=True).start()
+
+    def _segment_path(self, day, writer):
+        name = day if writer is None else f'{day}.{writer}'
+        return os.path.join(self.directory, f'{name}.jsonl')
+
+    def _rollup_path(self, day, writer):
+        name = day if writer is None else f'{day}.{writer}'
+        return os.path.join(self.directory, f'{name}.rollup.json')
+
+    def _writers_by_day(self):
+        """{day: [writer, ...]} for every segment on disk"""
+        writers = {}
+        for file in os.listdir(self.directory):
+            if file.endswith('.jsonl'):
+                stem = file[:-len('.jsonl')]
+                writers.setdefault(stem[:10], []).append(stem[11:] or None)
+        return writers
+
+    def append(self, visit):
+        """Record a visit; the partition is taken from its 'time' field"""
+        line = (json.dumps(visit, separators=(',', ':')) + '\n').encode('utf-8')
+        day = visit['time'][:10]
+        with self._lock:
+            if day != self._open_day:
+                self._open_partition(day)
+            self._open_file.write(line)
+            self._open_file.flush()
+            fold_visit(self._open_rollup, visit)
+            self._open_rollup['offset'] += len(line)
+            if time.monotonic() - self._last_rollup_flush > ROLLUP_FLUSH_INTERVAL:
+                self._write_rollup(day, self.writer, self._open_rollup)
+
+        if self._replication_queue is not None:
+            try:
+                self._replication_queue.put_nowait(visit)
+            except queue.Full:
+                print("⚠️ Visit replication queue full, dropping remote copy")
+
+    def _open_partition(self, day):
+        if self._open_file is not None:
+            self._write_rollup(self._open_day, self.writer, self._open_rollup)
+            self._open_file.close()
+        self._open_rollup = self._load_rollup(day, self.writer)
+        self._open_file = open(self._segment_path(day, self.writer), 'ab')
+        self._open_day = day
+        self._rollup_cache.pop((day, self.writer), None)
+
+    def _write_rollup(self, day, writer, rollup):
+        tmp_path = self._rollup_path(day, writer) + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(rollup, f)
+        os.replace(tmp_path, self._rollup_path(day, writer))
+        self._last_rollup_flush = time.monotonic()
+
+    def _load_rollup(self, day, writer):
+        """Read a partition's rollup, folding in any segment records it does not cover yet"""
+        try:
+            with open(self._rollup_path(day, writer)) as f:
+                rollup = json.load(f)
+        except (OSError, ValueError):
+            rollup = empty_rollup()
+
+        segment_path = self._segment_path(day, writer)
+        if os.path.exists(segment_path) and os.path.getsize(segment_path) > rollup['offset']:
+            with open(segment_path, 'rb') as f:
+                f.seek(rollup['offset'])
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break  # partial write from a crash
+                    try:
+                        fold_visit(rollup, json.loads(line))
+                    except ValueError:
+                        pass
+                    rollup['offset'] += len(line)
+        return rollup
+
+    def _rollup_for(self, day, writer):
+        if day == self._open_day and writer == self.writer:
+            return self._open_rollup
+        key = (day, writer)
+        if key in self._rollup_cache:
+            self._rollup_cache.move_to_end(key)
+            return self._rollup_cache[key]
+        rollup = self._load_rollup(day, writer)
+        # Only our own past partitions are final; other writers may still append to theirs
+        if day < date.today().isoformat() and writer == self.writer:
+            self._rollup_cache[key] = rollup
+            if len(self._rollup_cache) > ROLLUP_CACHE_SIZE:
+                self._rollup_cache.popitem(last=False)
+        return rollup
+
+    def stats(self, start, end, category=None):
+        """Aggregate rollups for the days start..end (inclusive) without reading segments"""
+        totals = {'total': 0, 'categories': {}, 'people': {}, 'hours': {}, 'days': {}}
+        day = start
+        with self._lock:
+            writers_by_day = self._writers_by_day()
+            while day <= end:
+                key = day.isoformat()
+                day += timedelta(days=1)
+                if key not in writers_by_day:
+                    continue
+                rollup = empty_rollup()
+                for writer in writers_by_day[key]:
+                    partition = self._rollup_for(key, writer)
+                    rollup['total'] += partition['total']
+                    for field in ('categories', 'people', 'hours'):
+                        for name, count in partition[field].items():
+                            rollup[field][name] = rollup[field].get(name, 0) + count
+
+                if category is None:
+                    day_total = rollup['total']
+                    for hour, count in rollup['hours'].items():
+                        totals['hours'][hour] = totals['hours'].get(hour, 0) + count
+                else:
+                    day_total = rollup['categories'].get(category, 0)
+                for name, count in rollup['categories'].items():
+                    if category is None or name == category:
+                        totals['categories'][name] = totals['categories'].get(name, 0) + count
+                for person, count in rollup['people'].items():
+                    if category is None or person.startswith(f'{category}/'):
+                        totals['people'][person] = totals['people'].get(person, 0) + count
+                totals['days'][key] = day_total
+                totals['total'] += day_total
+        return totals
+
+    def records(self, day, category=None):
+        """Raw visits for a single day, across all writers, in time order"""
+        key = day.isoformat()
+        visits = []
+        for writer in self._writers_by_day().get(key, []):
+            with open(self._segment_path(key, writer), 'rb') as f:
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break
+                    try:
+                        visit = json.loads(line)
+                    except ValueError:
+                        continue
+                    if category is None or visit.get('category') == category:
+                        visits.append(visit)
+        visits.sort(key=lambda visit: visit.get('time', ''))
+        return visits
+
+    def close(self):
+        with self._lock:
+            if self._open_file is not None:
+                self._write_rollup(self._open_day, self.writer, self._open_rollup)
+                self._open_file.close()
+                self._open_file = None
+                self._open_day = None
+
+    def _replicate(self):
+        while True:
+            visit = self._replication_queue.get()
+            while True:
+                try:
+                    self._replica.add_visit(visit)
+                    break
+                except Exception as e:
+                    print(f"❌ Visit replication failed, retrying: {str(e)}")
+                    time.sleep(5)
+
+
+def parse_category(value):
+    """Recorded category for a ?category= query parameter; None (all categories) when absent"""
+    if not value:
+        return None
+    if value not in VISIT_CATEGORIES:
+        raise ValueError(f"Unknown category: {value}")
+    return VISIT_CATEGORIES[value]
+
+
+def parse_day(value, default):
+    """Parse a YYYY-MM-DD query parameter"""
+    if not value:
+        return default
+    return datetime.strptime(value, '%Y-%m-%d').date()
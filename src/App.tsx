@@ -30,7 +30,6 @@ import VoiceSynthesizer from "./voiceSynthesis";
 import { ProfileModal } from "./components/ProfileModal";
 import { ProfileDetails } from "./components/ProfileDetails";
 import { addProfile } from "./firebase";
-import path from "path";
 import AIFaceAdd from "./components/AIFaceAdd";
 
 // Register ChartJS components
@@ -180,6 +179,10 @@ interface DetectedFace {
   gender?: string;
 }
 
+// YYYY-MM-DD in local time, the day format of the backend's visit log
+const localDay = (date: Date) =>
+  `${date.getFullYear()}-${String(date.getMonth() + 1).padStart(2, "0")}-${String(date.getDate()).padStart(2, "0")}`;
+
 interface VisitData {
   name: string;
   category: string;
@@ -331,25 +334,29 @@ function App() {
       })
       .catch(console.error);
 
-    // Set up Firebase listeners
-    const visitsRef = ref(database, "visits");
-    const staffRef = ref(database, "staff");
-    const customersRef = ref(database, "customers");
-
-    const unsubscribeVisits = onValue(visitsRef, (snapshot) => {
-      const data = snapshot.val();
-      if (data) {
-        const visitsArray = Object.values(data) as VisitData[];
+    // Visit metrics come from the backend's local visit log: two days of records plus rollups,
+    // instead of downloading the whole Firebase visits node on every change
+    const loadVisits = async () => {
+      try {
+        const now = new Date();
+        const yesterday = new Date(now.getTime() - 24 * 60 * 60 * 1000);
+        const yearAgo = new Date(now.getTime() - 365 * 24 * 60 * 60 * 1000);
+        const [yesterdayRes, todayRes, historyRes] = await Promise.all([
+          fetch(`http://localhost:5000/visits?date=${localDay(yesterday)}`),
+          fetch(`http://localhost:5000/visits?date=${localDay(now)}`),
+          fetch(`http://localhost:5000/visits/stats?start=${localDay(yearAgo)}&end=${localDay(now)}`),
+        ]);
+        if (!yesterdayRes.ok || !todayRes.ok || !historyRes.ok) return;
+        const [yesterdayData, todayData, history] = await Promise.all([
+          yesterdayRes.json(), todayRes.json(), historyRes.json()
+        ]);
+        const visitsArray = [...yesterdayData.visits, ...todayData.visits] as VisitData[];
         setVisits(visitsArray);
 
-        // Update metrics
-        const last24Hours = new Date();
-        last24Hours.setHours(last24Hours.getHours() - 24);
-
         const recentVisits = visitsArray.filter(
-            (visit) => 
-                new Date(visit.time) > last24Hours && 
-                visit.name !== "System" && 
+            (visit) =>
+                new Date(visit.time) > yesterday &&
+                visit.name !== "System" &&
                 visit.name !== "Initialization"
         );
 
@@ -357,16 +364,11 @@ function App() {
             (visit) => visit.type === "Unknown"
         );
 
-        const uniqueVisitors = new Set(recentVisits.map((visit) => visit.name));
+        // Returning: seen in the last 24 hours and more than once in the past year
+        const people = history.people as Record<string, number>;
         const returningVisitors = new Set(
             recentVisits
-                .filter((visit) =>
-                    visitsArray.some(
-                        (v) =>
-                            v.name === visit.name &&
-                            new Date(v.time) < new Date(visit.time)
-                    )
-                )
+                .filter((visit) => (people[`${visit.category}/${visit.name}`] || 0) > 1)
                 .map((visit) => visit.name)
         );
 
@@ -375,8 +377,16 @@ function App() {
             returning: returningVisitors.size,
             unknown: unknownVisits.length,
         });
+      } catch (error) {
+        console.error("Error loading visits:", error);
       }
-    });
+    };
+    loadVisits();
+    const visitsInterval = setInterval(loadVisits, 30000);
+
+    // Set up Firebase listeners
+    const staffRef = ref(database, "staff");
+    const customersRef = ref(database, "customers");
 
     const unsubscribeStaff = onValue(staffRef, (snapshot) => {
       const data = snapshot.val();
@@ -393,7 +403,7 @@ function App() {
     });
 
     return () => {
-      unsubscribeVisits();
+      clearInterval(visitsInterval);
       unsubscribeStaff();
       unsubscribeCustomers();
       if (voiceSynthesizerRef.current) {
@@ -995,7 +1005,7 @@ function App() {
                           <img
                             src={
                               profile.imagePath
-                                ? path.join(process.resourcesPath,"backend", profile.imagePath.replace("/backend",""))
+                                ? `http://localhost:5000${profile.imagePath.replace("/backend","")}?size=128`
                                 : "https://images.unsplash.com/photo-1633332755192-727a05c4013d?auto=format&fit=crop&w=200&h=200"
                             }
                             alt={profile.name}
@@ -24,6 +24,10 @@ interface AIFaceAddProps {
   onRemoveFace: (face: UnknownFace) => void;
 }
 
+// Backend images are fetched as cached thumbnails; captured data URLs are used as they are
+const thumbnail = (src: string, size: number) =>
+  src.startsWith('http') ? `${src}?size=${size}` : src;
+
 const AIFaceAdd: React.FC<AIFaceAddProps> = ({ faces, onAdd, onRemoveFace }) => {
   const [selectedIdx, setSelectedIdx] = useState<number | null>(null);
   const [form, setForm] = useState({
@@ -100,7 +104,7 @@ const AIFaceAdd: React.FC<AIFaceAddProps> = ({ faces, onAdd, onRemoveFace }) =>
             >
               {face.imageSrc ? (
                 <img 
-                  src={face.imageSrc} 
+                  src={thumbnail(face.imageSrc, 256)} 
                   alt="Detected face"
                   className="w-full h-full object-cover rounded-lg"
                 />
@@ -122,7 +126,7 @@ const AIFaceAdd: React.FC<AIFaceAddProps> = ({ faces, onAdd, onRemoveFace }) =>
         <div className="w-32 h-32 rounded-lg bg-gray-200 flex items-center justify-center mb-6">
           {selectedIdx !== null && faces[selectedIdx]?.imageSrc ? (
             <img 
-              src={faces[selectedIdx].imageSrc} 
+              src={thumbnail(faces[selectedIdx].imageSrc!, 256)} 
               alt="Selected face"
               className="w-full h-full object-cover rounded-lg"
             />